@@ -0,0 +1,217 @@
+"""
+クラスタ数選択モジュール
+
+計算済みのデンドログラム（scipy linkage形式）から、全ての切断位置を一括で評価してクラスタ数を選ぶ。
+クラスタリングをやり直さずに選択方法だけを切り替えられる。
+
+- gap: 併合距離の増加幅が最大の位置で切断
+- threshold: 併合距離が閾値以下の併合だけを適用（閾値で切断）
+- silhouette: 増加幅の大きい候補について、標本化したシルエット係数が最大のクラスタ数
+"""
+
+import heapq
+from typing import List
+
+import numpy as np
+from scipy import sparse
+from sklearn.preprocessing import normalize
+
+STRATEGIES = ('gap', 'threshold', 'silhouette')
+
+
+def gap_count(distances: np.ndarray) -> int:
+    """
+    併合距離の増加幅が最大の位置で切断したときのクラスタ数
+
+    Args:
+        distances: 併合距離（昇順）
+
+    Returns:
+        クラスタ数（制約なし）
+    """
+    if len(distances) <= 1:
+        return 1
+    return int(len(distances) - np.argmax(np.diff(distances)))
+
+
+def threshold_count(distances: np.ndarray, distance_threshold: float) -> int:
+    """
+    併合距離が閾値以下の併合だけを適用したときのクラスタ数
+
+    Args:
+        distances: 併合距離（昇順）
+        distance_threshold: 距離閾値
+
+    Returns:
+        クラスタ数
+    """
+    return int(len(distances) + 1 - np.searchsorted(distances, distance_threshold, side='right'))
+
+
+def gap_candidates(distances: np.ndarray, n_candidates: int, min_clusters: int, max_clusters: int) -> List[int]:
+    """
+    増加幅の大きい順に、制約を満たすクラスタ数の候補を返す
+
+    Args:
+        distances: 併合距離（昇順）
+        n_candidates: 候補数
+        min_clusters: クラスタ数の下限
+        max_clusters: クラスタ数の上限
+
+    Returns:
+        クラスタ数の候補（増加幅の大きい順、重複なし）
+    """
+    if len(distances) <= 1:
+        return []
+    diffs = np.diff(distances)
+    counts = len(distances) - np.argsort(-diffs, kind='stable')
+    valid = counts[(counts >= min_clusters) & (counts <= max_clusters)]
+    return [int(count) for count in valid[:n_candidates]]
+
+
+def silhouette_count(
+    linkages: np.ndarray,
+    vectors: sparse.csr_matrix,
+    candidates: List[int],
+    weights: np.ndarray = None,
+    sample_size: int = 1000,
+    seed: int = 0
+) -> int:
+    """
+    候補のうち、標本化したシルエット係数が最大のクラスタ数
+
+    Args:
+        linkages: デンドログラム（葉は vectors の行）
+        vectors: TF-IDF行列
+        candidates: クラスタ数の候補
+        weights: 各行の件数（重複をまとめた場合）
+        sample_size: シルエット係数を計算する行数
+        seed: 標本化の乱数シード
+
+    Returns:
+        クラスタ数（候補が空の場合は0）
+    """
+    if not candidates:
+        return 0
+
+    n_samples = vectors.shape[0]
+    vectors = normalize(vectors).tocsr()
+    weights = np.ones(n_samples) if weights is None else np.asarray(weights, dtype=float)
+
+    # 件数に比例した確率で行を標本化（全件以下の場合は全行）
+    if np.sum(weights) <= sample_size:
+        sample = np.repeat(np.arange(n_samples), weights.astype(int))
+    else:
+        rng = np.random.default_rng(seed)
+        sample = rng.choice(n_samples, size=sample_size, p=weights / np.sum(weights))
+
+    scores = [
+        sampled_silhouette(vectors, cut_tree(linkages[:, :2], n_samples, n_clusters), weights, sample)
+        for n_clusters in candidates
+    ]
+    return candidates[int(np.argmax(scores))]
+
+
+def sampled_silhouette(
+    vectors: sparse.csr_matrix,
+    labels: np.ndarray,
+    weights: np.ndarray,
+    sample: np.ndarray
+) -> float:
+    """
+    標本行のシルエット係数（コサイン距離）の平均
+
+    単位ベクトルとクラスタの平均距離は「1 - クラスタのベクトル和との内積 / 件数」で求まるため、
+    クラスタごとのベクトル和を1回計算するだけで全標本行・全クラスタの平均距離を一括で計算できる。
+    内積は疎行列のまま扱い（語を共有しないクラスタとの平均距離は1）、
+    標本数 × クラスタ数 の密な配列は作らない。
+
+    Args:
+        vectors: L2正規化済みのTF-IDF行列
+        labels: 0始まりのクラスタラベル
+        weights: 各行の件数
+        sample: 標本行の番号
+
+    Returns:
+        シルエット係数の平均（-1 〜 1）
+    """
+    n_clusters = labels.max() + 1
+    if n_clusters <= 1:
+        return 0.0
+
+    membership = sparse.csr_matrix(
+        (weights, (labels, np.arange(len(labels)))),
+        shape=(n_clusters, len(labels))
+    )
+    sums = membership @ vectors
+    sizes = np.bincount(labels, weights=weights, minlength=n_clusters)
+
+    own = labels[sample]
+    similarities = (vectors[sample] @ sums.T).tocoo()
+    self_similarity = np.asarray(vectors[sample].multiply(vectors[sample]).sum(axis=1)).ravel()
+    is_own = similarities.col == own[similarities.row]
+
+    # 自クラスタ内の平均距離（自分自身を除く）
+    own_similarity = np.zeros(len(sample))
+    np.add.at(own_similarity, similarities.row[is_own], similarities.data[is_own])
+    own_size = sizes[own]
+    others = np.maximum(own_size - 1, 1)
+    intra = 1 - (own_similarity - self_similarity) / others
+
+    # 最も近い他クラスタとの平均距離（内積が0のクラスタが残っていれば距離1が候補）
+    other_rows = similarities.row[~is_own]
+    other_distances = 1 - similarities.data[~is_own] / sizes[similarities.col[~is_own]]
+    nearest = np.full(len(sample), np.inf)
+    np.minimum.at(nearest, other_rows, other_distances)
+    unshared = np.bincount(other_rows, minlength=len(sample)) < n_clusters - 1
+    nearest[unshared] = np.minimum(nearest[unshared], 1.0)
+
+    scores = (nearest - intra) / np.maximum(np.maximum(nearest, intra), 1e-12)
+    scores[own_size <= 1] = 0.0
+    return float(np.mean(scores))
+
+
+def cut_tree(children: np.ndarray, n_samples: int, n_clusters: int) -> np.ndarray:
+    """
+    併合履歴を先頭から (n_samples - n_clusters) 回適用してクラスタラベルを求める
+
+    デンドログラムを上から (n_clusters - 1) 回分割するのと同じで、
+    AgglomerativeClustering(n_clusters=...) と同じ分割・同じラベル番号になる
+    （番号は sklearn の _hc_cut と同様に、分割に使うヒープ内の順序で付ける）。
+
+    Args:
+        children: 併合履歴（各行が併合した2ノードのID）
+        n_samples: サンプル数
+        n_clusters: クラスタ数
+
+    Returns:
+        0始まりのクラスタラベル
+    """
+    if n_clusters <= 1 or n_samples <= 1:
+        return np.zeros(n_samples, dtype=np.intp)
+
+    n_merges = max(0, n_samples - n_clusters)
+    merges = np.asarray(children[:n_merges], dtype=np.intp)
+
+    parent = np.arange(2 * n_samples - 1)
+    merged = n_samples + np.arange(n_merges)
+    parent[merges[:, 0]] = merged
+    parent[merges[:, 1]] = merged
+
+    # ポインタジャンプで根まで辿る（O(n log n)）
+    while True:
+        grand = parent[parent]
+        if np.array_equal(grand, parent):
+            break
+        parent = grand
+
+    # 根から最も新しい併合ノードを順に2つに分割（ノードIDを負にしたヒープで最大を取り出す）
+    heap = [-(n_samples + len(children) - 1)]
+    for _ in range(n_clusters - 1):
+        left, right = children[-heap[0] - n_samples]
+        heapq.heappush(heap, -int(left))
+        heapq.heappushpop(heap, -int(right))
+
+    numbers = np.empty(2 * n_samples - 1, dtype=np.intp)
+    numbers[[-node for node in heap]] = np.arange(len(heap))
+    return numbers[parent[:n_samples]]
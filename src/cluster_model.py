@@ -0,0 +1,262 @@
+"""
+クラスタリングモデルモジュール
+
+会社ごとのクラスタリング結果（ベクトル化状態・クラスタ重心・デンドログラム・代表名）を保存・読み込みし、
+新しいオーダーを既存クラスタへ割り当てる（--assign）ために使う
+
+保存形式（model_path のフォルダ）:
+    manifest.json                 会社名・各配列の形状・ベクトル化設定
+    tfidf/*.npy                   全社共通のベクトル化状態（語彙・IDF）
+    companies/<番号>/*.npy        会社ごとの重心（CSR形式）・件数・デンドログラム・代表名
+    companies/<番号>/tfidf/*.npy  会社ごとのベクトル化状態（tfidf_scope: company の場合）
+    companies/<番号>/extensions/<番号>/
+                                  --assign で追加したクラスタの重心・件数・ベクトル化状態
+
+配列は非圧縮の .npy で保存するため、読み込み時にメモリマップでき、再学習せずに即座に利用できる。
+"""
+
+import json
+import logging
+import shutil
+import tempfile
+from pathlib import Path
+from typing import Any, Dict, Optional
+
+import numpy as np
+from scipy import sparse
+
+logger = logging.getLogger(__name__)
+
+FORMAT_VERSION = 1
+
+# 保存先フォルダ内でこのモジュールが管理する項目（置き換え順）
+_MODEL_ENTRIES = ('tfidf', 'companies', 'manifest.json')
+
+
+class ClusterModel:
+    """保存済みクラスタリングモデル"""
+
+    MANIFEST_FILE = 'manifest.json'
+
+    def __init__(
+        self,
+        tfidf_state: Optional[Dict[str, Any]] = None,
+        companies: Optional[Dict[str, Dict[str, Any]]] = None
+    ):
+        """
+        初期化
+
+        Args:
+            tfidf_state: 全社共通のベクトル化状態（tfidf_scope: company の場合はNone）
+            companies: 会社名 → 会社モデル
+                       （tfidf: 会社ごとのベクトル化状態またはNone, centroids: 重心行列,
+                         sizes: クラスタごとの件数, representatives: 代表名配列,
+                         linkage: デンドログラム, leaf_texts: デンドログラムの葉の正規化テキスト,
+                         extensions: --assign で追加したクラスタ群のリスト（各要素は独自の
+                                     tfidf・centroids・sizes を持ち、クラスタIDは既存の後ろに続く））
+        """
+        self.tfidf_state = tfidf_state
+        self.companies = companies if companies is not None else {}
+
+    def tfidf_state_for(self, company: str) -> Optional[Dict[str, Any]]:
+        """会社のベクトル化状態を取得（会社ごとの状態がなければ全社共通の状態）"""
+        entry = self.companies.get(company)
+        if entry is not None and entry.get('tfidf') is not None:
+            return entry['tfidf']
+        return self.tfidf_state
+
+    def save(self, model_dir: Path) -> Path:
+        """
+        モデルを保存
+
+        一時フォルダに書き出してから置き換えるため、保存に失敗しても既存のモデルは壊れない。
+        置き換えるのはこのツールが作成する項目（manifest.json・tfidf/・companies/）のみで、
+        保存先フォルダ内のそれ以外のファイルには触れない。
+
+        Args:
+            model_dir: 保存先フォルダ
+
+        Returns:
+            マニフェストファイルのパス
+
+        Raises:
+            FileExistsError: 保存先がモデル以外のファイルを含む既存のフォルダ（manifest.json がない）
+        """
+        model_dir = Path(model_dir)
+        if model_dir.exists() and not (model_dir / self.MANIFEST_FILE).exists() and any(model_dir.iterdir()):
+            raise FileExistsError(f"保存先がクラスタリングモデルのフォルダではありません（空ではありません）: {model_dir}")
+        model_dir.mkdir(parents=True, exist_ok=True)
+        work_dir = Path(tempfile.mkdtemp(prefix=model_dir.name + '.', suffix='.tmp', dir=model_dir.parent))
+
+        try:
+            manifest = {'format_version': FORMAT_VERSION, 'tfidf': None, 'companies': {}}
+            if self.tfidf_state is not None:
+                manifest['tfidf'] = _save_tfidf_state(work_dir / 'tfidf', self.tfidf_state)
+
+            for number, (company, entry) in enumerate(self.companies.items()):
+                folder = f"{number:05d}"
+                manifest['companies'][company] = _save_company(work_dir / 'companies' / folder, entry, folder)
+
+            with open(work_dir / self.MANIFEST_FILE, 'w', encoding='utf-8') as f:
+                json.dump(manifest, f, ensure_ascii=False, indent=2)
+
+            # 既存の項目を一時フォルダへ退避してから入れ替える（マニフェストは最後）
+            old_dir = work_dir / 'old'
+            old_dir.mkdir()
+            for name in _MODEL_ENTRIES:
+                target = model_dir / name
+                if target.exists():
+                    target.rename(old_dir / name)
+                if (work_dir / name).exists():
+                    (work_dir / name).rename(target)
+        finally:
+            shutil.rmtree(work_dir, ignore_errors=True)
+
+        logger.info(f"クラスタリングモデルを保存しました: {model_dir} ({len(self.companies)}社)")
+        return model_dir / self.MANIFEST_FILE
+
+    @classmethod
+    def load(cls, model_dir: Path, mmap_mode: Optional[str] = 'r') -> 'ClusterModel':
+        """
+        モデルを読み込み
+
+        Args:
+            model_dir: 保存先フォルダ
+            mmap_mode: 配列の読み込み方法（'r': 読み取り専用のメモリマップ / None: メモリに読み込む）
+                       読み込んだモデルを同じフォルダへ上書き保存する場合はNoneを指定する
+
+        Returns:
+            読み込んだモデル
+
+        Raises:
+            FileNotFoundError: マニフェストファイルが見つからない
+            ValueError: 対応していない保存形式
+        """
+        model_dir = Path(model_dir)
+        manifest_path = model_dir / cls.MANIFEST_FILE
+        if not manifest_path.exists():
+            raise FileNotFoundError(f"Model manifest not found: {manifest_path}")
+
+        with open(manifest_path, 'r', encoding='utf-8') as f:
+            manifest = json.load(f)
+
+        if manifest.get('format_version') != FORMAT_VERSION:
+            raise ValueError(f"Unsupported model format: {manifest.get('format_version')}")
+
+        tfidf_state = None
+        if manifest['tfidf'] is not None:
+            tfidf_state = _load_tfidf_state(model_dir / 'tfidf', manifest['tfidf'], mmap_mode)
+
+        companies = {
+            company: _load_company(model_dir / 'companies' / meta['folder'], meta, mmap_mode)
+            for company, meta in manifest['companies'].items()
+        }
+
+        logger.info(f"クラスタリングモデルを読み込みました: {model_dir} ({len(companies)}社)")
+        return cls(tfidf_state=tfidf_state, companies=companies)
+
+
+def _save_tfidf_state(folder: Path, state: Dict[str, Any]) -> Dict[str, Any]:
+    """ベクトル化状態の配列を保存し、マニフェスト用の設定値を返す"""
+    folder.mkdir(parents=True, exist_ok=True)
+    np.save(folder / 'features.npy', np.asarray(state['features'], dtype=np.int64))
+    np.save(folder / 'idf.npy', np.asarray(state['idf'], dtype=np.float64))
+    if 'vocabulary' in state:
+        # 語彙は特徴量番号順の文字列配列として保存
+        terms = np.empty(len(state['vocabulary']), dtype=object)
+        for term, index in state['vocabulary'].items():
+            terms[index] = term
+        np.save(folder / 'vocabulary.npy', terms.astype(str))
+
+    return {
+        'vectorizer': state['vectorizer'],
+        'ngram_range': list(state['ngram_range']),
+        'n_features': int(state['n_features']),
+        'chunk_size': int(state['chunk_size']),
+        'default_idf': float(state['default_idf']),
+        'has_vocabulary': 'vocabulary' in state
+    }
+
+
+def _load_tfidf_state(folder: Path, meta: Dict[str, Any], mmap_mode: Optional[str]) -> Dict[str, Any]:
+    """保存したベクトル化状態を読み込み"""
+    state = {
+        'vectorizer': meta['vectorizer'],
+        'ngram_range': tuple(meta['ngram_range']),
+        'n_features': meta['n_features'],
+        'chunk_size': meta['chunk_size'],
+        'default_idf': meta['default_idf'],
+        'features': np.load(folder / 'features.npy', mmap_mode=mmap_mode),
+        'idf': np.load(folder / 'idf.npy', mmap_mode=mmap_mode)
+    }
+    if meta['has_vocabulary']:
+        terms = np.load(folder / 'vocabulary.npy', mmap_mode=mmap_mode)
+        state['vocabulary'] = {term: index for index, term in enumerate(terms.tolist())}
+    return state
+
+
+def _save_company(folder: Path, entry: Dict[str, Any], name: str) -> Dict[str, Any]:
+    """会社モデルの配列を保存し、マニフェスト用の情報を返す"""
+    folder.mkdir(parents=True, exist_ok=True)
+    meta = _save_centroids(folder, entry)
+    np.save(folder / 'representatives.npy', np.asarray(entry['representatives']).astype(str))
+    np.save(folder / 'linkage.npy', np.asarray(entry.get('linkage', np.zeros((0, 4))), dtype=np.float64))
+    np.save(folder / 'leaf_texts.npy', np.asarray(entry.get('leaf_texts', [])).astype(str))
+
+    meta['folder'] = name
+    meta['extensions'] = []
+    for number, extension in enumerate(entry.get('extensions', [])):
+        extension_folder = folder / 'extensions' / f"{number:02d}"
+        extension_folder.mkdir(parents=True, exist_ok=True)
+        meta['extensions'].append(_save_centroids(extension_folder, extension))
+    return meta
+
+
+def _load_company(folder: Path, meta: Dict[str, Any], mmap_mode: Optional[str]) -> Dict[str, Any]:
+    """保存した会社モデルを読み込み"""
+    entry = _load_centroids(folder, meta, mmap_mode)
+    entry.update({
+        'representatives': np.load(folder / 'representatives.npy', mmap_mode=mmap_mode),
+        'linkage': np.load(folder / 'linkage.npy', mmap_mode=mmap_mode),
+        'leaf_texts': np.load(folder / 'leaf_texts.npy', mmap_mode=mmap_mode),
+        'extensions': [
+            _load_centroids(folder / 'extensions' / f"{number:02d}", extension, mmap_mode)
+            for number, extension in enumerate(meta.get('extensions', []))
+        ]
+    })
+    return entry
+
+
+def _save_centroids(folder: Path, entry: Dict[str, Any]) -> Dict[str, Any]:
+    """重心（CSR形式）・件数・ベクトル化状態を保存し、マニフェスト用の情報を返す"""
+    centroids = sparse.csr_matrix(entry['centroids'])
+    np.save(folder / 'centroids_data.npy', centroids.data)
+    np.save(folder / 'centroids_indices.npy', centroids.indices)
+    np.save(folder / 'centroids_indptr.npy', centroids.indptr)
+    np.save(folder / 'sizes.npy', np.asarray(entry['sizes'], dtype=np.float64))
+
+    meta = {
+        'n_clusters': int(centroids.shape[0]),
+        'n_features': int(centroids.shape[1]),
+        'tfidf': None
+    }
+    if entry.get('tfidf') is not None:
+        meta['tfidf'] = _save_tfidf_state(folder / 'tfidf', entry['tfidf'])
+    return meta
+
+
+def _load_centroids(folder: Path, meta: Dict[str, Any], mmap_mode: Optional[str]) -> Dict[str, Any]:
+    """保存した重心・件数・ベクトル化状態を読み込み"""
+    centroids = sparse.csr_matrix(
+        (
+            np.load(folder / 'centroids_data.npy', mmap_mode=mmap_mode),
+            np.load(folder / 'centroids_indices.npy', mmap_mode=mmap_mode),
+            np.load(folder / 'centroids_indptr.npy', mmap_mode=mmap_mode)
+        ),
+        shape=(meta['n_clusters'], meta['n_features'])
+    )
+    return {
+        'tfidf': _load_tfidf_state(folder / 'tfidf', meta['tfidf'], mmap_mode) if meta['tfidf'] else None,
+        'centroids': centroids,
+        'sizes': np.load(folder / 'sizes.npy', mmap_mode=mmap_mode)
+    }
@@ -4,48 +4,166 @@
 TF-IDFベクトル化とコサイン類似度による階層的クラスタリング
 """
 
+import heapq
 import logging
+import os
+import tempfile
 import numpy as np
 import pandas as pd
-from typing import Dict, Any
-from sklearn.feature_extraction.text import TfidfVectorizer
-from sklearn.metrics.pairwise import cosine_similarity
+from collections import Counter
+from typing import Dict, Any, List, Optional, Tuple, Union
+from sklearn.feature_extraction.text import CountVectorizer, HashingVectorizer
 from sklearn.cluster import AgglomerativeClustering
+from sklearn.preprocessing import normalize
+from scipy import sparse
 from scipy.cluster.hierarchy import linkage
+from scipy.spatial.distance import squareform
+from minhash_blocking import MinHashBlocker
+from cluster_model import ClusterModel
+from result_cache import ResultCache
+from nn_chain import average_linkage
+from scheduler import HybridScheduler
+from topk_cosine import knn_graph, nearest_rows
+from cluster_count import (
+    STRATEGIES, cut_tree, gap_candidates, gap_count, silhouette_count, threshold_count
+)
 
 logger = logging.getLogger(__name__)
 
+# 結果に影響しないため、結果キャッシュのキーに含めない設定
+# （会社別設定は会社ごとにキーへ含める。並列実行・チャンク分割・割り当ての設定は結果を変えない）
+_CACHE_IGNORED_KEYS = (
+    'company_cluster_settings', 'workers', 'model_path', 'cache_dir', 'cache_max_mb', 'phrase_cache_dir',
+    'memo_size', 'giant_rows', 'batch_rows', 'parallel_memory_mb',
+    'distance_chunk_size', 'knn_chunk_size', 'vectorize_chunk_size',
+    'assign_min_similarity', 'drift_threshold'
+)
+
 
 class DataClustering:
     """クラスタリングクラス"""
 
-    def __init__(self, config: Dict[str, Any]):
+    def __init__(self, config: Dict[str, Any], preprocessing_config: Dict[str, Any] = None):
         """
         初期化
 
         Args:
             config: クラスタリング設定（clustering セクション）
+            preprocessing_config: 前処理設定（preprocessing セクション、結果キャッシュのキーに使用）
         """
         self.config = config
-        self.company_cluster_settings = config.get('company_cluster_settings', {})
-        logger.info("DataClustering initialized")
+        self.preprocessing_config = preprocessing_config or {}
+        self.company_cluster_settings = config.get('company_cluster_settings') or {}
+
+        # クラスタの決め方（count: クラスタ数を決めて切断 / threshold: 固定の距離閾値で切断）
+        self.mode = config.get('mode', 'count')
+        if self.mode not in ('count', 'threshold'):
+            logger.warning(f"不正なモード設定 '{self.mode}'。countを使用します。")
+            self.mode = 'count'
+
+        # デフォルトクラスタ数の選び方（gap: 距離増加幅 / threshold: 距離閾値 / silhouette: シルエット係数）
+        self.cluster_count_strategy = config.get('cluster_count_strategy', 'gap')
+        if self.cluster_count_strategy not in STRATEGIES:
+            logger.warning(f"不正なクラスタ数選択設定 '{self.cluster_count_strategy}'。gapを使用します。")
+            self.cluster_count_strategy = 'gap'
+        self.cluster_distance_threshold = float(config.get('cluster_distance_threshold', 0.5))
+        self.silhouette_sample_size = int(config.get('silhouette_sample_size', 1000))
+        self.silhouette_candidates = int(config.get('silhouette_candidates', 10))
+
+        # クラスタリングエンジン（dense: 密な距離行列 / sparse_knn: 疎なk近傍グラフ）
+        self.engine = config.get('engine', 'dense')
+        if self.engine not in ('dense', 'sparse_knn'):
+            logger.warning(f"不正なエンジン設定 '{self.engine}'。denseを使用します。")
+            self.engine = 'dense'
+        # 自動計算に使ったデンドログラムをそのまま切断する（再クラスタリングしない）
+        self.dendrogram_cut = bool(config.get('dendrogram_cut', True))
+        # 代表名の選び方（mode: 最頻出 / medoid: TF-IDF重心に最も近い作業名称）
+        self.representative = config.get('representative', 'mode')
+        if self.representative not in ('mode', 'medoid'):
+            logger.warning(f"不正な代表名設定 '{self.representative}'。modeを使用します。")
+            self.representative = 'mode'
+        # ベクトル化方式（word: 単語トークン / char_hashing: 文字n-gramのハッシュ）
+        vectorizer = config.get('vectorizer', 'word')
+        if vectorizer not in ('word', 'char_hashing'):
+            logger.warning(f"不正なベクトル化設定 '{vectorizer}'。wordを使用します。")
+            vectorizer = 'word'
+        self.vectorizer_options = {
+            'vectorizer': vectorizer,
+            'ngram_range': tuple(config.get('ngram_range', (1, 3))),
+            'n_features': int(config.get('hash_features', 2 ** 20)),
+            'chunk_size': int(config.get('vectorize_chunk_size', 10000))
+        }
+
+        # TF-IDFの学習範囲（company: 会社ごと（従来どおり） / global: 全社で1回）
+        self.tfidf_scope = config.get('tfidf_scope', 'company')
+        if self.tfidf_scope not in ('global', 'company'):
+            logger.warning(f"不正なTF-IDF設定 '{self.tfidf_scope}'。companyを使用します。")
+            self.tfidf_scope = 'company'
+
+        # 同一の正規化テキストをまとめて件数の重み付きでクラスタリングする
+        self.collapse_duplicates = bool(config.get('collapse_duplicates', False))
+        self.knn_neighbors = int(config.get('knn_neighbors', 10))
+        self.knn_chunk_size = int(config.get('knn_chunk_size', 1000))
+        self.distance_chunk_size = int(config.get('distance_chunk_size', 1000))
+
+        # denseエンジンの1社あたりのメモリ上限（MB、0以下: 無制限）
+        self.memory_budget_mb = float(config.get('memory_budget_mb', 2048))
+        # 上限を超える会社の距離をディスク上のメモリマップに置く作業フォルダ（空: sparse_knnで近似）
+        self.scratch_dir = config.get('scratch_dir') or ''
+
+        # MinHash LSHブロッキング（この行数以上の会社のみ、0以下: 無効）
+        self.lsh_min_rows = int(config.get('lsh_min_rows', 50000))
+        self.blocker = MinHashBlocker(
+            num_perm=int(config.get('lsh_num_perm', 64)),
+            bands=int(config.get('lsh_bands', 16)),
+            shingle_size=int(config.get('lsh_shingle_size', 2))
+        )
+
+        # クラスタリングモデルの保存先（空: 保存しない）と割り当てモード（--assign）の設定
+        self.model_path = config.get('model_path') or ''
+        self.assign_min_similarity = float(config.get('assign_min_similarity', 0.5))
+        self.drift_threshold = float(config.get('drift_threshold', 0.2))
+
+        # 会社単位の結果キャッシュ（空: 無効）
+        cache_dir = config.get('cache_dir') or ''
+        self.cache = ResultCache(cache_dir, config.get('cache_max_mb', 512)) if cache_dir else None
+
+        # 並列実行プロセス数（1: 逐次実行、0以下: CPUコア数）
+        self.workers = int(config.get('workers', 1))
+        if self.workers <= 0:
+            self.workers = os.cpu_count() or 1
+        # 並列実行時の振り分け（巨大な会社は単独実行、小さな会社はバッチにまとめる）
+        self.scheduler = HybridScheduler(
+            workers=self.workers,
+            giant_rows=int(config.get('giant_rows', 20000)),
+            batch_rows=int(config.get('batch_rows', 2000)),
+            memory_limit_mb=float(config.get('parallel_memory_mb', 0))
+        )
+        logger.info(f"DataClustering initialized (engine={self.engine})")
 
     def calculate_default_clusters(
         self,
         distance_threshold: float,
         linkages: np.ndarray,
-        n_samples: int
+        n_samples: int,
+        tfidf_matrix=None,
+        weights: np.ndarray = None
     ) -> int:
         """
         デフォルトクラスタ数を自動計算
 
-        デンドログラムの距離増加率から最適なクラスタ数を決定
+        cluster_count_strategy 設定に従い、デンドログラムの全切断位置からクラスタ数を決定
+        - gap: 距離増加幅が最大の位置
+        - threshold: 併合距離が distance_threshold 以下の併合のみ適用
+        - silhouette: 増加幅の大きい候補のうち、標本化したシルエット係数が最大のもの
         制約: 2 〜 データ件数 * 0.5
 
         Args:
-            distance_threshold: 距離閾値
+            distance_threshold: 距離閾値（threshold で使用）
             linkages: 階層的クラスタリング結果
             n_samples: サンプル数
+            tfidf_matrix: デンドログラムの葉のTF-IDF行列（silhouette で使用）
+            weights: 各葉の件数（重複をまとめた場合、silhouette で使用）
 
         Returns:
             クラスタ数
@@ -53,21 +171,31 @@ class DataClustering:
         if n_samples <= 2:
             return 1
 
-        # デンドログラムの距離増加率を計算
         distances = linkages[:, 2]
 
-        # 距離の増加率が最も大きい箇所を探す
-        if len(distances) > 1:
-            diffs = np.diff(distances)
-            max_diff_idx = np.argmax(diffs)
-            n_clusters = len(distances) - max_diff_idx
-        else:
-            n_clusters = 1
-
         # 制約: 2 〜 n_samples * 0.5
         min_clusters = 2
         max_clusters = max(2, int(n_samples * 0.5))
 
+        n_clusters = 0
+        if self.cluster_count_strategy == 'threshold':
+            n_clusters = threshold_count(distances, distance_threshold)
+        elif self.cluster_count_strategy == 'silhouette' and tfidf_matrix is not None:
+            # 重複をまとめた場合、葉のデンドログラムは距離0の併合を補った部分より後ろ
+            n_leaves = tfidf_matrix.shape[0]
+            candidates = gap_candidates(
+                distances, self.silhouette_candidates, min_clusters, min(max_clusters, n_leaves)
+            )
+            n_clusters = silhouette_count(
+                linkages[len(linkages) - (n_leaves - 1):],
+                tfidf_matrix,
+                candidates,
+                weights,
+                self.silhouette_sample_size
+            )
+        if n_clusters == 0:
+            n_clusters = gap_count(distances)
+
         n_clusters = max(min_clusters, min(n_clusters, max_clusters))
 
         return n_clusters
@@ -138,6 +266,537 @@ class DataClustering:
 
         return final_count
 
+    def _cluster_dense(
+        self,
+        company: str,
+        tfidf_matrix,
+        weights: np.ndarray = None,
+        on_disk: bool = False
+    ) -> Tuple[np.ndarray, int, np.ndarray]:
+        """
+        密な距離行列による階層的クラスタリング
+
+        Args:
+            company: 企業名
+            tfidf_matrix: TF-IDF行列
+            weights: 各行の件数（重複をまとめた場合）
+            on_disk: 距離を scratch_dir 上のメモリマップファイルに置く
+
+        Returns:
+            (クラスタラベル, クラスタ数, デンドログラム（scipy linkage形式）)
+        """
+        linkages = self._dense_linkage(tfidf_matrix, weights, on_disk)
+
+        n_clusters = self._select_cluster_count(company, linkages, tfidf_matrix, weights)
+
+        if self.dendrogram_cut or weights is not None or on_disk:
+            # 計算済みのデンドログラムをクラスタ数で切断
+            cluster_labels = cut_tree(linkages[:, :2], tfidf_matrix.shape[0], n_clusters)
+        else:
+            # AgglomerativeClusteringで再クラスタリング
+            clustering_model = AgglomerativeClustering(
+                n_clusters=n_clusters,
+                metric='precomputed',
+                linkage='average'
+            )
+            condensed_distance = _condensed_cosine_distances(tfidf_matrix, self.distance_chunk_size)
+            cluster_labels = clustering_model.fit_predict(squareform(condensed_distance))
+
+        return cluster_labels, n_clusters, linkages
+
+    def _dense_linkage(self, tfidf_matrix, weights: np.ndarray = None, on_disk: bool = False) -> np.ndarray:
+        """condensed形式の距離に対するaverage linkageを計算"""
+        if on_disk:
+            return self._dense_linkage_on_disk(tfidf_matrix, weights)
+
+        # コサイン距離（1 - コサイン類似度）をcondensed形式・float32で直接計算
+        condensed_distance = _condensed_cosine_distances(tfidf_matrix, self.distance_chunk_size)
+
+        if weights is not None:
+            # 重複をまとめた要素に件数の重みを付け、最近傍チェーン法で距離をその場で更新
+            return average_linkage(condensed_distance, weights)
+        return linkage(condensed_distance, method='average')
+
+    def _dense_linkage_on_disk(self, tfidf_matrix, weights: np.ndarray = None) -> np.ndarray:
+        """
+        condensed形式の距離を scratch_dir 上のメモリマップファイルに置いてaverage linkageを計算
+
+        距離は行チャンクごとにファイルへ書き込み、linkageは距離をその場で更新する最近傍チェーン法で
+        計算するため、常駐メモリは距離計算チャンクと O(n) の作業領域に収まる。
+        ファイルは計算後に削除する。
+        """
+        n_samples = tfidf_matrix.shape[0]
+        n_pairs = n_samples * (n_samples - 1) // 2
+        os.makedirs(self.scratch_dir, exist_ok=True)
+        fd, path = tempfile.mkstemp(prefix='distances_', suffix='.f32', dir=self.scratch_dir)
+        os.close(fd)
+        logger.info(f"距離をディスクに配置: {path} ({n_pairs * 4 / 1024 ** 2:.0f}MB)")
+
+        condensed_distance = None
+        try:
+            condensed_distance = np.memmap(path, dtype=np.float32, mode='w+', shape=(n_pairs,))
+            _condensed_cosine_distances(tfidf_matrix, self.distance_chunk_size, out=condensed_distance)
+            linkages = average_linkage(condensed_distance, weights)
+        finally:
+            # マップを閉じてから削除する（Windowsではマップ中のファイルを削除できない）
+            if condensed_distance is not None:
+                try:
+                    condensed_distance._mmap.close()
+                except (AttributeError, BufferError, ValueError):
+                    # 例外のトレースバックなどが配列を参照している場合は閉じられない（削除を試みる）
+                    pass
+                del condensed_distance
+            try:
+                os.remove(path)
+            except OSError as e:
+                logger.warning(f"一時ファイルを削除できませんでした: {path}: {e}")
+
+        return linkages
+
+    def _cluster_sparse_knn(
+        self,
+        company: str,
+        tfidf_matrix,
+        weights: np.ndarray = None
+    ) -> Tuple[np.ndarray, int, np.ndarray]:
+        """
+        疎なk近傍グラフによる接続制約付き階層的クラスタリング
+
+        n×nの距離行列を作らず、TF-IDF行列から上位k件のコサイン近傍グラフを構築し、
+        グラフの辺のみを併合候補としてaverage linkageを実行する。
+        グラフにない組は無関係（コサイン距離1）とみなすため、メモリ使用量は O(n・k) に収まる。
+
+        Args:
+            company: 企業名
+            tfidf_matrix: TF-IDF行列
+            weights: 各行の件数（重複をまとめた場合）
+
+        Returns:
+            (クラスタラベル, クラスタ数, デンドログラム（scipy linkage形式）)
+        """
+        linkages = self._sparse_knn_linkage(tfidf_matrix, weights)
+
+        n_clusters = self._select_cluster_count(company, linkages, tfidf_matrix, weights)
+
+        cluster_labels = cut_tree(linkages[:, :2], tfidf_matrix.shape[0], n_clusters)
+
+        return cluster_labels, n_clusters, linkages
+
+    def _sparse_knn_linkage(self, tfidf_matrix, weights: np.ndarray = None) -> np.ndarray:
+        """疎なk近傍グラフ上のaverage linkageを計算"""
+        vectors = _with_empty_marker(tfidf_matrix)
+        graph = knn_graph(vectors, self.knn_neighbors, self.knn_chunk_size)
+        return _sparse_average_linkage(graph, weights)
+
+    def _cluster_blocked(
+        self,
+        company: str,
+        tfidf_matrix,
+        texts: List[str],
+        weights: np.ndarray = None
+    ) -> Tuple[np.ndarray, int, np.ndarray]:
+        """
+        MinHash LSHブロックごとの階層的クラスタリング
+
+        行をMinHash LSHで候補ブロックに分割し、ブロック内でのみ average linkage を計算する。
+        ブロック間は無関係（距離1）とみなして各ブロックのデンドログラムを1つに統合し、
+        通常と同じ手順でクラスタ数の決定・切断を行う。
+
+        Args:
+            company: 企業名
+            tfidf_matrix: TF-IDF行列
+            texts: 前処理済みテキスト（tfidf_matrix の行に対応）
+            weights: 各行の件数（重複をまとめた場合）
+
+        Returns:
+            (クラスタラベル, クラスタ数, デンドログラム（scipy linkage形式）)
+        """
+        n_samples = tfidf_matrix.shape[0]
+        blocks = self.blocker.block(texts)
+        order = np.argsort(blocks, kind='stable')
+        offsets = np.concatenate([[0], np.cumsum(np.bincount(blocks))])
+
+        block_members = []
+        block_linkages = []
+        for start, stop in zip(offsets[:-1], offsets[1:]):
+            members = order[start:stop]
+            block_weights = weights[members] if weights is not None else None
+            if len(members) <= 1:
+                block_linkage = np.zeros((0, 4))
+            else:
+                engine = self._select_engine(company, len(members), block_weights)
+                if engine == 'sparse_knn':
+                    block_linkage = self._sparse_knn_linkage(tfidf_matrix[members], block_weights)
+                else:
+                    block_linkage = self._dense_linkage(tfidf_matrix[members], block_weights, engine == 'dense_disk')
+            block_members.append(members)
+            block_linkages.append(block_linkage)
+
+        linkages = _merge_block_linkages(block_linkages, block_members, n_samples, weights)
+
+        n_clusters = self._select_cluster_count(company, linkages, tfidf_matrix, weights)
+
+        cluster_labels = cut_tree(linkages[:, :2], n_samples, n_clusters)
+
+        return cluster_labels, n_clusters, linkages
+
+    def _select_cluster_count(
+        self,
+        company: str,
+        linkages: np.ndarray,
+        tfidf_matrix=None,
+        weights: np.ndarray = None
+    ) -> int:
+        """
+        デンドログラムからクラスタ数を決定（自動計算＋企業別設定）
+
+        重複をまとめた場合は、元の全行で計算したときの距離0の併合を補ってから自動計算する。
+        クラスタ数はデンドログラムの要素数を上限とする。
+
+        Args:
+            company: 企業名
+            linkages: 階層的クラスタリング結果
+            tfidf_matrix: デンドログラムの葉のTF-IDF行列
+            weights: 各要素の件数（重複をまとめた場合）
+
+        Returns:
+            クラスタ数
+
+        mode: threshold、または企業別設定が {threshold: 距離} の場合は、自動計算の代わりに
+        距離閾値で切断したクラスタ数を使う（mode: threshold では固定・オフセット設定も適用）。
+        """
+        n_leaves = len(linkages) + 1
+        n_samples = n_leaves if weights is None else int(np.sum(weights))
+
+        threshold = self._company_threshold(company)
+        if threshold is not None:
+            # 固定の距離閾値で切断（距離0の併合は常に閾値以下のため補う必要はない）
+            n_clusters = threshold_count(linkages[:, 2], threshold)
+            logger.info(f"{company}: 距離閾値 {threshold} で切断={n_clusters}クラスタ")
+            if not isinstance(self.company_cluster_settings.get(company), dict):
+                n_clusters = self.get_cluster_count(company, n_clusters)
+            return min(max(1, n_clusters), n_leaves)
+
+        if n_samples > n_leaves:
+            padded = np.zeros((n_samples - 1, linkages.shape[1]))
+            padded[n_samples - n_leaves:] = linkages
+            linkages = padded
+
+        # デフォルトクラスタ数を自動計算
+        default_clusters = self.calculate_default_clusters(
+            distance_threshold=self.cluster_distance_threshold,
+            linkages=linkages,
+            n_samples=n_samples,
+            tfidf_matrix=tfidf_matrix,
+            weights=weights
+        )
+
+        # 企業別設定を反映
+        return min(self.get_cluster_count(company, default_clusters), n_leaves)
+
+    def _select_engine(self, company: str, n_samples: int, weights: np.ndarray = None) -> str:
+        """
+        会社（またはLSHブロック）の計算方式を決定
+
+        Args:
+            company: 企業名
+            n_samples: クラスタリング対象の件数
+            weights: 各要素の件数（重複をまとめた場合）
+
+        Returns:
+            dense（メモリ上の距離）/ dense_disk（scratch_dir 上のメモリマップ距離）/ sparse_knn
+        """
+        if self.engine == 'sparse_knn':
+            return 'sparse_knn'
+        if self._fits_memory_budget(company, n_samples, weights):
+            return 'dense'
+        return 'dense_disk' if self.scratch_dir else 'sparse_knn'
+
+    def _company_threshold(self, company: str) -> float:
+        """
+        会社のデンドログラムを切断する距離閾値
+
+        Returns:
+            企業別設定 {threshold: 距離} があればその値、mode: threshold なら cluster_distance_threshold、
+            それ以外はNone（クラスタ数で切断）
+        """
+        setting = self.company_cluster_settings.get(company)
+        if isinstance(setting, dict) and 'threshold' in setting:
+            try:
+                return float(setting['threshold'])
+            except (TypeError, ValueError):
+                logger.warning(f"{company}: 不正な距離閾値設定 '{setting['threshold']}'。既定の設定を使用します。")
+        if self.mode == 'threshold':
+            return self.cluster_distance_threshold
+        return None
+
+    def _trivial_labels(self, company: str, text_codes: np.ndarray, n_unique: int) -> np.ndarray:
+        """
+        ユニークな正規化テキストだけでクラスタが決まる会社のラベルを求める
+
+        - 全行が同じテキスト → 1クラスタ
+        - クラスタ数が事前に決まり（固定設定、または2件以下で自動計算=1）、
+          1クラスタ → 全行を1クラスタ / ユニーク数以上 → テキストごとに1クラスタ
+
+        ベクトル化・距離計算・linkage を行わずに決まる場合のみラベルを返す
+        （model_path 設定時は重心を保存するため常にNone）。
+
+        Args:
+            company: 企業名
+            text_codes: 各行のユニークなテキスト番号（出現順）
+            n_unique: ユニークなテキスト数
+
+        Returns:
+            0始まりのクラスタラベル（通常のクラスタリングが必要な場合はNone）
+        """
+        if self.model_path:
+            return None
+        if n_unique == 1:
+            return np.zeros(len(text_codes), dtype=int)
+        if self._company_threshold(company) is not None:
+            # 距離閾値で切断する場合はテキスト間の距離が必要
+            return None
+
+        setting = self.company_cluster_settings.get(company)
+        if isinstance(setting, (int, float)) and not isinstance(setting, bool):
+            n_clusters = max(1, int(setting))
+            logger.info(f"{company}: 調整後={n_clusters}（固定）")
+        elif len(text_codes) <= 2:
+            n_clusters = self.get_cluster_count(company, 1)
+        else:
+            return None
+
+        if n_clusters == 1:
+            if self.representative == 'medoid':
+                return None
+            return np.zeros(len(text_codes), dtype=int)
+        if n_unique <= n_clusters:
+            return np.asarray(text_codes, dtype=int)
+        return None
+
+    def _fits_memory_budget(self, company: str, n_samples: int, weights: np.ndarray = None) -> bool:
+        """
+        denseエンジンの見積もりメモリが1社あたりの上限に収まるか判定
+
+        上限を超える場合はログを出し、scratch_dir 設定時はディスク上の距離で、
+        未設定時は近似エンジン（sparse_knn）で処理させる。
+
+        Args:
+            company: 企業名
+            n_samples: クラスタリング対象の件数
+            weights: 各要素の件数（重複をまとめた場合）
+
+        Returns:
+            上限内ならTrue
+        """
+        if self.memory_budget_mb <= 0:
+            return True
+
+        estimated_mb = _estimate_dense_bytes(n_samples, weights is not None, self.distance_chunk_size) / 1024 ** 2
+        if estimated_mb <= self.memory_budget_mb:
+            return True
+
+        fallback = "距離をディスク（scratch_dir）に置いて計算します" if self.scratch_dir else "sparse_knnエンジンで近似クラスタリングします"
+        logger.warning(
+            f"{company}: 見積もりメモリ {estimated_mb:.0f}MB が上限 {self.memory_budget_mb}MB を超えるため、{fallback}"
+        )
+        return False
+
+    def _fit_global_tfidf(
+        self,
+        text_codes: np.ndarray,
+        categories: np.ndarray
+    ) -> Tuple[sparse.csr_matrix, Dict[str, Any]]:
+        """
+        全社の正規化テキストでTF-IDFを1回だけ学習し、全行を変換
+
+        ユニークなテキストのみをベクトル化し、件数で重み付けした文書頻度を使うため、
+        全行に TfidfVectorizer を適用した場合と同じ結果になる。
+
+        Args:
+            text_codes: 全行のテキストのコード（categories の位置）
+            categories: 前処理済みテキストの一覧
+
+        Returns:
+            (全行のTF-IDF行列, ベクトル化状態)（語彙が空の場合は (None, None)）
+        """
+        # 出現するテキストのみを出現順に並べる（整数の符号化のみで文字列は比較しない）
+        text_codes, used = pd.factorize(text_codes)
+        unique_texts = categories[used]
+        try:
+            unique_matrix, state = _tfidf_vectorize(
+                list(unique_texts), np.bincount(text_codes), return_state=True, **self.vectorizer_options
+            )
+        except ValueError as e:
+            logger.warning(f"全社共通のTF-IDFベクトル化に失敗。会社ごとにベクトル化します。エラー: {e}")
+            return None, None
+
+        logger.info(f"全社共通TF-IDF: {len(text_codes)}件, 語彙数={unique_matrix.shape[1]}")
+        return unique_matrix[text_codes], state
+
+    def _cluster_company(
+        self,
+        company: str,
+        texts: Union[List[str], pd.Categorical],
+        names: List[str],
+        row_matrix: sparse.csr_matrix = None
+    ) -> Tuple[np.ndarray, np.ndarray, Dict[str, Any]]:
+        """
+        1社分のクラスタリングを実行
+
+        プロセスプールから呼び出せるよう、DataFrameではなくリスト・カテゴリ型を受け取る。
+
+        Args:
+            company: 企業名
+            texts: 前処理済みテキスト（カテゴリ型の場合はコードをそのまま使い、文字列を再符号化しない）
+            names: 作業名称（代表名の候補）
+            row_matrix: 全社共通で計算済みのTF-IDF行（省略時は会社内でベクトル化）
+
+        Returns:
+            (クラスタID（1始まり）, クラスタID順の代表名配列, 会社モデル)
+            会社モデルは model_path 設定時のみ作成（クラスタリングをスキップした場合はNone）
+        """
+        logger.info(f"処理中: {company} ({len(texts)}件)")
+
+        if len(texts) <= 1:
+            # データが1件以下の場合はクラスタリングをスキップ
+            logger.info(f"{company}: データが1件以下のためクラスタリングをスキップ")
+            company_model = None
+            if self.model_path and len(texts) == 1:
+                company_model = self._single_text_model(company, list(texts), names, row_matrix)
+            return np.ones(len(texts), dtype=int), np.array([names[0] if names else ""], dtype=object), company_model
+
+        if isinstance(texts, pd.Categorical):
+            unique_codes, unique_values = texts.codes.astype(np.intp), np.asarray(texts.categories, dtype=object)
+        else:
+            unique_codes, unique_values = pd.factorize(np.asarray(texts, dtype=object), use_na_sentinel=False)
+
+        trivial_labels = self._trivial_labels(company, unique_codes, len(unique_values))
+        if trivial_labels is not None:
+            if self.representative == 'medoid':
+                # 各クラスタは同一テキストのみのため、メドイドは先頭行（同点は先頭）
+                _, first_rows = np.unique(trivial_labels, return_index=True)
+                representative_names = np.asarray(names, dtype=object)[first_rows]
+            else:
+                representative_names = _representative_names(trivial_labels, names)
+            logger.info(f"{company}: 完了 ({trivial_labels.max() + 1}クラスタ、ユニークなテキストから直接決定)")
+            return trivial_labels + 1, representative_names, None
+
+        if self.collapse_duplicates:
+            # 同一の正規化テキストを1要素にまとめ、件数を重みとしてクラスタリング
+            text_codes, unique_texts = unique_codes, unique_values
+            weights = np.bincount(text_codes)
+            logger.info(f"{company}: 重複をまとめてクラスタリング ({len(texts)}件 → {len(unique_texts)}件)")
+        else:
+            text_codes, unique_texts, weights = np.arange(len(texts)), unique_values[unique_codes], None
+
+        tfidf_state = None
+        try:
+            if row_matrix is not None:
+                # 全社共通のTF-IDFから各テキストの最初の行を取り出す
+                _, first_rows = np.unique(text_codes, return_index=True)
+                tfidf_matrix = row_matrix[first_rows]
+                if tfidf_matrix.nnz == 0:
+                    raise ValueError("empty vocabulary; perhaps the documents only contain stop words")
+            else:
+                tfidf_matrix, tfidf_state = _tfidf_vectorize(
+                    list(unique_texts), weights, return_state=True, **self.vectorizer_options
+                )
+        except ValueError as e:
+            logger.warning(f"{company}: TF-IDFベクトル化に失敗。全て同じクラスタに割り当てます。エラー: {e}")
+            if self.model_path:
+                logger.warning(f"{company}: モデルに保存しません（--assign では新規にクラスタリングします）")
+            return np.ones(len(texts), dtype=int), np.array([names[0]], dtype=object), None
+
+        try:
+            if len(unique_texts) <= 1:
+                cluster_labels, n_clusters, linkages = np.zeros(len(unique_texts), dtype=int), 1, np.zeros((0, 4))
+            elif self.lsh_min_rows > 0 and len(texts) >= self.lsh_min_rows:
+                cluster_labels, n_clusters, linkages = self._cluster_blocked(
+                    company, tfidf_matrix, list(unique_texts), weights
+                )
+            else:
+                engine = self._select_engine(company, len(unique_texts), weights)
+                if engine == 'sparse_knn':
+                    cluster_labels, n_clusters, linkages = self._cluster_sparse_knn(company, tfidf_matrix, weights)
+                else:
+                    cluster_labels, n_clusters, linkages = self._cluster_dense(
+                        company, tfidf_matrix, weights, on_disk=engine == 'dense_disk'
+                    )
+
+        except Exception as e:
+            logger.warning(f"{company}: クラスタリングに失敗。全て同じクラスタに割り当てます。エラー: {e}")
+            cluster_labels = np.zeros(len(unique_texts), dtype=int)
+            n_clusters = 1
+            linkages = np.zeros((0, 4))
+
+        company_model = None
+        if self.model_path:
+            # 割り当て・再切断用に重心・件数・デンドログラムを保持（デンドログラムの葉は leaf_texts の順）
+            centroids, sizes = _cluster_centroids(tfidf_matrix, cluster_labels, weights)
+            company_model = {
+                'tfidf': tfidf_state,
+                'centroids': centroids,
+                'sizes': sizes,
+                'linkage': linkages,
+                'leaf_texts': np.asarray(unique_texts, dtype=object)
+            }
+
+        # まとめた要素のラベルを元の行に展開
+        cluster_labels = cluster_labels[text_codes]
+
+        # クラスタIDを付与（1から始まる連番）
+        cluster_ids = cluster_labels + 1
+
+        # 代表名を付与（最頻出の作業名称 または 重心に最も近い作業名称）
+        representative_names = _representative_names(
+            cluster_labels,
+            names,
+            tfidf_matrix[text_codes] if self.representative == 'medoid' else None
+        )
+
+        if company_model is not None:
+            company_model['representatives'] = representative_names
+
+        logger.info(f"{company}: 完了 ({n_clusters}クラスタ)")
+        return cluster_ids, representative_names, company_model
+
+    def _single_text_model(
+        self,
+        company: str,
+        texts: List[str],
+        names: List[str],
+        row_matrix: sparse.csr_matrix = None
+    ) -> Optional[Dict[str, Any]]:
+        """
+        1件だけの会社のモデル（1クラスタ）を作成
+
+        --assign で新規の会社として毎回クラスタリングし直さないよう、1件の行を重心として保存する。
+
+        Returns:
+            会社モデル（ベクトル化できない場合はNone）
+        """
+        try:
+            if row_matrix is not None:
+                tfidf_matrix, tfidf_state = row_matrix[:1], None
+                if tfidf_matrix.nnz == 0:
+                    raise ValueError("empty vocabulary; perhaps the documents only contain stop words")
+            else:
+                tfidf_matrix, tfidf_state = _tfidf_vectorize(texts, return_state=True, **self.vectorizer_options)
+        except ValueError as e:
+            logger.warning(f"{company}: ベクトル化できないためモデルに保存しません（--assign では新規にクラスタリングします）: {e}")
+            return None
+
+        centroids, sizes = _cluster_centroids(tfidf_matrix, np.zeros(1, dtype=int))
+        return {
+            'tfidf': tfidf_state,
+            'centroids': centroids,
+            'sizes': sizes,
+            'linkage': np.zeros((0, 4)),
+            'leaf_texts': np.asarray(texts, dtype=object),
+            'representatives': np.array([names[0]], dtype=object)
+        }
+
     def cluster_by_company(
         self,
         df: pd.DataFrame,
@@ -155,101 +814,789 @@ class DataClustering:
 
         処理:
         1. 会社ごとにグルーピング
-        2. TF-IDFベクトル化
+        2. TF-IDFベクトル化（tfidf_scope: global の場合は全社で1回）
         3. コサイン類似度計算
-        4. AgglomerativeClustering実行
+        4. AgglomerativeClustering実行（engine設定によりdense / sparse_knnを切替）
         5. クラスタ数決定（自動計算 or 設定値）
         6. クラスタID・代表名付与
+        7. model_path 設定時はクラスタリングモデルを保存
+
+        workers が2以上の場合は HybridScheduler で実行する（giant_rows 以上の会社はメインプロセスで実行、
+        その他はバッチにまとめて並行してプロセスプールに投入。結果は入力順に並べ直すため出力は逐次実行と同じ）。
+
+        cache_dir 設定時は、テキスト・作業名称・設定が前回と同じ会社の結果をキャッシュから再利用する
+        （model_path 設定時はモデルに重心を保存するためキャッシュを使わない）。
         """
-        companies = df['会社名'].unique()
+        companies, order, offsets = _partition_companies(df)
         logger.info(f"クラスタリング開始: {len(companies)}社")
 
-        result_dfs = []
+        # テキストは整数コードで扱い、会社ごとにカテゴリ型（その会社のテキストのみ）にして渡す
+        text_codes, categories = _text_codes(df[text_column])
+        text_codes = text_codes[order]
+        name_values = df['作業名称'].to_numpy()[order]
 
-        for company in companies:
-            company_df = df[df['会社名'] == company].copy()
-            logger.info(f"処理中: {company} ({len(company_df)}件)")
+        def company_texts(code):
+            local_codes, used = pd.factorize(text_codes[offsets[code]:offsets[code + 1]])
+            return pd.Categorical.from_codes(local_codes, categories[used])
 
-            if len(company_df) <= 1:
-                # データが1件以下の場合はクラスタリングをスキップ
-                company_df['クラスタID'] = 1
-                company_df['代表名'] = company_df['作業名称'].iloc[0] if len(company_df) > 0 else ""
-                result_dfs.append(company_df)
-                logger.info(f"{company}: データが1件以下のためクラスタリングをスキップ")
-                continue
+        cache_keys = {}
+        if self.cache is not None and self.model_path:
+            logger.info("model_path が設定されているため結果キャッシュを使用しません")
+        elif self.cache is not None:
+            cache_keys = self._cache_keys(companies, offsets, company_texts, name_values, text_codes, categories)
 
-            # TF-IDFベクトル化
-            texts = company_df[text_column].tolist()
-            vectorizer = TfidfVectorizer(
-                token_pattern=r'(?u)\b\w+\b',  # 文字ベースでトークン化
-                min_df=1
+        results = {}
+        for code, key in cache_keys.items():
+            cached = self.cache.get(key)
+            if cached is not None:
+                logger.info(f"{companies[code]}: キャッシュを使用 ({offsets[code + 1] - offsets[code]}件)")
+                results[code] = (*cached, None)
+        pending = [code for code in range(len(companies)) if code not in results]
+
+        global_matrix, global_state = None, None
+        if self.tfidf_scope == 'global' and pending:
+            global_matrix, global_state = self._fit_global_tfidf(text_codes, categories)
+
+        def job_args(code):
+            rows = slice(offsets[code], offsets[code + 1])
+            row_matrix = global_matrix[rows] if global_matrix is not None else None
+            return companies[code], company_texts(code), name_values[rows].tolist(), row_matrix
+
+        if self.workers > 1 and len(pending) > 1:
+            results.update(self.scheduler.run(
+                sizes={code: int(offsets[code + 1] - offsets[code]) for code in pending},
+                estimate_bytes=self._estimate_job_bytes,
+                run_single=lambda code: self._cluster_company(*job_args(code)),
+                batch_function=self._cluster_batch,
+                batch_args=job_args
+            ))
+        else:
+            for code in pending:
+                results[code] = self._cluster_company(*job_args(code))
+
+        if cache_keys:
+            for code in pending:
+                self.cache.put(cache_keys[code], *results[code][:2])
+            self.cache.evict()
+            self.cache.log_summary()
+
+        if self.model_path:
+            model = ClusterModel(tfidf_state=global_state)
+            for code, (_, _, company_model) in results.items():
+                if company_model is not None:
+                    model.companies[companies[code]] = company_model
+            model.save(self.model_path)
+
+        return _assemble_results(df, order, offsets, results)
+
+    def _cluster_batch(self, jobs: List[Tuple]) -> List[Tuple[np.ndarray, np.ndarray, Dict[str, Any]]]:
+        """複数社をまとめて1プロセスで処理（引数は _cluster_company と同じ組のリスト）"""
+        return [self._cluster_company(*job) for job in jobs]
+
+    def _estimate_job_bytes(self, n_samples: int) -> float:
+        """
+        1社の見積もりメモリ（バイト）
+
+        denseエンジンは n² に比例し、メモリ上限（memory_budget_mb）を超える会社は
+        sparse_knn / ディスク上の距離で処理されるため上限値で打ち切る。
+        """
+        sparse_bytes = n_samples * max(self.knn_neighbors, 1) * 16
+        if self.engine == 'sparse_knn':
+            return sparse_bytes
+        dense_bytes = _estimate_dense_bytes(n_samples, self.collapse_duplicates, self.distance_chunk_size)
+        if self.memory_budget_mb > 0:
+            dense_bytes = min(dense_bytes, self.memory_budget_mb * 1024 ** 2)
+        return max(dense_bytes, sparse_bytes)
+
+    def _cache_keys(
+        self,
+        companies: pd.Index,
+        offsets: np.ndarray,
+        company_texts,
+        name_values: np.ndarray,
+        text_codes: np.ndarray,
+        categories: np.ndarray
+    ) -> Dict[int, str]:
+        """
+        会社ごとの結果キャッシュのキーを作成
+
+        キーには会社のテキストと作業名称（代表名の候補）、前処理設定、クラスタリング設定、
+        その会社のクラスタ数設定を含める。tfidf_scope: global の場合は全社のテキストでIDFが決まるため、
+        全社のテキストのハッシュも含める（いずれかの会社が変わると全社が再計算される）。
+        テキストはユニークなテキスト（出現順）と各行のコードでハッシュする。
+
+        Returns:
+            会社番号 → キャッシュキー
+        """
+        settings = {key: value for key, value in self.config.items() if key not in _CACHE_IGNORED_KEYS}
+        preprocessing = {
+            key: value for key, value in self.preprocessing_config.items() if key not in _CACHE_IGNORED_KEYS
+        }
+        corpus = None
+        if self.tfidf_scope == 'global':
+            codes, used = pd.factorize(text_codes)
+            corpus = ResultCache.make_key(categories[used], codes)
+
+        keys = {}
+        for code, company in enumerate(companies):
+            rows = slice(offsets[code], offsets[code + 1])
+            texts = company_texts(code)
+            keys[code] = ResultCache.make_key(
+                np.asarray(texts.categories, dtype=object),
+                texts.codes,
+                name_values[rows],
+                preprocessing,
+                settings,
+                self.company_cluster_settings.get(company),
+                corpus
             )
+        return keys
 
-            try:
-                tfidf_matrix = vectorizer.fit_transform(texts)
-            except ValueError as e:
-                logger.warning(f"{company}: TF-IDFベクトル化に失敗。全て同じクラスタに割り当てます。エラー: {e}")
-                company_df['クラスタID'] = 1
-                company_df['代表名'] = company_df['作業名称'].iloc[0]
-                result_dfs.append(company_df)
+    def assign_by_company(
+        self,
+        df: pd.DataFrame,
+        text_column: str
+    ) -> pd.DataFrame:
+        """
+        保存済みモデルの既存クラスタへ新しいオーダーを割り当て（--assign）
+
+        各行を保存時と同じベクトル化状態でTF-IDFに変換し、コサイン類似度が最も高い重心の
+        クラスタIDを付与する。クラスタIDと代表名は保存時のものを維持する。
+
+        類似度が assign_min_similarity 未満の行の割合（未一致率）が drift_threshold を超えた会社は、
+        未一致の行だけで語彙を学習し直してクラスタリングし、既存の最大IDの後ろに新しいクラスタとして追加する
+        （新しいクラスタ群はベクトル化状態ごとモデルに保存され、次回以降の割り当て先になる）。
+        モデルにない会社は通常どおりクラスタリングして追加する。
+        割り当て後、重心と件数を更新してモデルを上書き保存する。
+
+        Args:
+            df: データフレーム
+            text_column: クラスタリング対象列（前処理済みテキスト）
+
+        Returns:
+            クラスタID・代表名が追加されたデータフレーム（出力形式は cluster_by_company と同じ）
+
+        Raises:
+            ValueError: model_path が設定されていない
+            FileNotFoundError: モデルファイルが見つからない
+        """
+        if not self.model_path:
+            raise ValueError("model_path is not configured")
+
+        # 更新後に同じフォルダへ上書き保存するため、メモリマップせずに読み込む
+        model = ClusterModel.load(self.model_path, mmap_mode=None)
+
+        companies, order, offsets = _partition_companies(df)
+        logger.info(f"既存クラスタへの割り当て開始: {len(companies)}社")
+
+        text_values = df[text_column].to_numpy()[order]
+        name_values = df['作業名称'].to_numpy()[order]
+
+        results = {}
+        for code, company in enumerate(companies):
+            rows = slice(offsets[code], offsets[code + 1])
+            texts, names = text_values[rows].tolist(), name_values[rows].tolist()
+            state = model.tfidf_state_for(company)
+
+            if company not in model.companies:
+                logger.info(f"{company}: モデルに存在しないため新規にクラスタリングします")
+                row_matrix = _tfidf_transform(texts, state) if state is not None else None
+                results[code] = self._cluster_company(company, texts, names, row_matrix)
+                if results[code][2] is not None:
+                    model.companies[company] = results[code][2]
                 continue
 
-            # コサイン類似度計算
-            similarity_matrix = cosine_similarity(tfidf_matrix)
+            company_model = model.companies[company]
+            cluster_ids = self._assign_company(company, texts, names, state, company_model)
+            results[code] = (cluster_ids, company_model['representatives'], company_model)
 
-            # 距離行列（1 - コサイン類似度）
-            distance_matrix = 1 - similarity_matrix
+        model.save(self.model_path)
 
-            # 階層的クラスタリング（linkage計算）
-            try:
-                # 距離行列を1次元配列に変換（condensed form）
-                from scipy.spatial.distance import squareform
-                condensed_distance = squareform(distance_matrix, checks=False)
-                linkages = linkage(condensed_distance, method='average')
-
-                # デフォルトクラスタ数を自動計算
-                default_clusters = self.calculate_default_clusters(
-                    distance_threshold=0.5,
-                    linkages=linkages,
-                    n_samples=len(company_df)
-                )
+        return _assemble_results(df, order, offsets, results)
 
-                # 企業別設定を反映
-                n_clusters = self.get_cluster_count(company, default_clusters)
+    def _assign_company(
+        self,
+        company: str,
+        texts: List[str],
+        names: List[str],
+        tfidf_state: Dict[str, Any],
+        company_model: Dict[str, Any]
+    ) -> np.ndarray:
+        """
+        1社分の行を既存クラスタへ割り当て、会社モデル（重心・件数・代表名・追加クラスタ群）を更新
 
-                # AgglomerativeClusteringでクラスタリング
-                clustering_model = AgglomerativeClustering(
-                    n_clusters=n_clusters,
-                    metric='precomputed',
-                    linkage='average'
-                )
-                cluster_labels = clustering_model.fit_predict(distance_matrix)
-
-            except Exception as e:
-                logger.warning(f"{company}: クラスタリングに失敗。全て同じクラスタに割り当てます。エラー: {e}")
-                cluster_labels = np.zeros(len(company_df), dtype=int)
-
-            # クラスタIDを付与（1から始まる連番）
-            company_df['クラスタID'] = cluster_labels + 1
-
-            # 代表名を付与（各クラスタで最頻出の作業名称）
-            representative_names = {}
-            for cluster_id in company_df['クラスタID'].unique():
-                cluster_rows = company_df[company_df['クラスタID'] == cluster_id]
-                # 最頻出の作業名称を取得
-                most_common = cluster_rows['作業名称'].mode()
-                if len(most_common) > 0:
-                    representative_names[cluster_id] = most_common.iloc[0]
-                else:
-                    representative_names[cluster_id] = cluster_rows['作業名称'].iloc[0]
+        保存時のクラスタと、過去の --assign で追加したクラスタ群（extensions）は、それぞれ自身の
+        ベクトル化状態で変換して比較する。先に作られたクラスタ群を優先し、そこで一致しなかった行だけを
+        後のクラスタ群の一致で置き換えるため、割り当て済みの行は再実行しても同じクラスタに残る。
+
+        未一致率が drift_threshold を超えた場合は、未一致の行を新しく学習したベクトル化状態で
+        クラスタリングし、新しいクラスタ群として extensions に追加する（未知の語も特徴量に含まれる）。
+
+        Args:
+            company: 企業名
+            texts: 前処理済みテキスト
+            names: 作業名称（代表名の候補）
+            tfidf_state: 保存時のクラスタのベクトル化状態
+            company_model: 会社モデル（この関数内で更新される）
+
+        Returns:
+            クラスタID（1始まり）
+        """
+        extensions = list(company_model.get('extensions', []))
+        segments = [dict(company_model, tfidf=tfidf_state)] + extensions
+
+        labels = np.zeros(len(texts), dtype=int)
+        segment_of = np.zeros(len(texts), dtype=int)
+        similarities = np.full(len(texts), -np.inf)
+        matched = np.zeros(len(texts), dtype=bool)
+        matrices, starts = [], []
+        n_existing = 0
+        for index, segment in enumerate(segments):
+            matrix = _tfidf_transform(texts, segment['tfidf'], count_unknown=True)
+            segment_labels, segment_similarities = nearest_rows(matrix, segment['centroids'], self.knn_chunk_size)
+
+            # 先のクラスタ群で一致しなかった行だけ、より類似度の高いクラスタへ置き換える
+            better = ~matched & (segment_similarities > similarities)
+            labels[better] = n_existing + segment_labels[better]
+            segment_of[better] = index
+            similarities[better] = segment_similarities[better]
+            matched |= similarities >= self.assign_min_similarity
+
+            matrices.append(matrix)
+            starts.append(n_existing)
+            n_existing += segment['centroids'].shape[0]
+
+        unmatched = ~matched
+        drift = float(np.mean(unmatched))
+        representatives = company_model['representatives']
+
+        if drift > self.drift_threshold:
+            logger.warning(
+                f"{company}: 未一致率 {drift:.1%} が閾値 {self.drift_threshold:.1%} を超えたため、"
+                f"未一致の{int(unmatched.sum())}件を新しいクラスタとしてクラスタリングします"
+            )
+            rows = np.flatnonzero(unmatched)
+            # 保存済みの語彙に投影すると未知の語が失われるため、未一致の行だけでベクトル化し直す
+            new_ids, new_names, new_model = self._cluster_company(
+                company,
+                [texts[i] for i in rows],
+                [names[i] for i in rows]
+            )
+            if new_model is None:
+                logger.warning(f"{company}: 未一致の行をベクトル化できないため、最も近い既存クラスタへ割り当てます")
+            else:
+                labels[rows] = n_existing + new_ids - 1
+                segment_of[rows] = len(segments)
+                representatives = np.concatenate([representatives, new_names])
+                extensions.append({
+                    'tfidf': new_model['tfidf'],
+                    'centroids': new_model['centroids'],
+                    'sizes': new_model['sizes']
+                })
+        else:
+            logger.info(f"{company}: {len(texts)}件を既存の{n_existing}クラスタへ割り当て（未一致率 {drift:.1%}）")
+
+        # 既存の重心と今回割り当てた行の平均を件数で重み付けして更新（新しいクラスタ群は作成時の重心のまま）
+        for index, segment in enumerate(segments):
+            rows = np.flatnonzero(segment_of == index)
+            n_clusters = segment['centroids'].shape[0]
+            batch_centroids, batch_sizes = _cluster_centroids(
+                matrices[index][rows], labels[rows] - starts[index], n_clusters=n_clusters
+            )
+            sizes = np.asarray(segment['sizes'], dtype=float)
+            total = sizes + batch_sizes
+            centroids = (
+                sparse.diags(np.divide(sizes, total, out=np.zeros(n_clusters), where=total > 0))
+                @ segment['centroids']
+                + sparse.diags(np.divide(batch_sizes, total, out=np.zeros(n_clusters), where=total > 0))
+                @ batch_centroids
+            ).tocsr()
+            target = company_model if index == 0 else extensions[index - 1]
+            target['centroids'] = centroids
+            target['sizes'] = total
+
+        company_model['representatives'] = representatives
+        company_model['extensions'] = extensions
+
+        return labels + 1
+
+
+def _text_codes(column: pd.Series) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    テキスト列を整数コードとテキストの一覧に変換
+
+    カテゴリ型（前処理の出力）の場合はコードをそのまま使い、文字列のハッシュを行わない。
+    欠損値は空文字列として扱う。
+
+    Returns:
+        (各行のコード, コードに対応するテキストの配列)
+    """
+    if isinstance(column.dtype, pd.CategoricalDtype):
+        codes = column.cat.codes.to_numpy().astype(np.intp)
+        categories = np.asarray(column.cat.categories, dtype=object)
+    else:
+        codes, categories = pd.factorize(column.to_numpy(dtype=object))
+        categories = np.asarray(categories, dtype=object)
+
+    if (codes < 0).any():
+        empty = np.flatnonzero(categories == "")
+        if len(empty) == 0:
+            categories = np.append(categories, np.array([""], dtype=object))
+            empty = [len(categories) - 1]
+        codes = np.where(codes < 0, empty[0], codes)
+    return codes, categories
+
+
+def _partition_companies(df: pd.DataFrame) -> Tuple[pd.Index, np.ndarray, np.ndarray]:
+    """
+    会社名を一度だけ符号化し、会社順に並べた行位置と各社の開始位置を求める
+
+    Returns:
+        (会社名（出現順）, 会社順に並べた行位置, 各社の開始位置（末尾に全件数）)
+    """
+    codes, companies = pd.factorize(df['会社名'], use_na_sentinel=False)
+    order = np.argsort(codes, kind='stable')
+    offsets = np.concatenate([[0], np.cumsum(np.bincount(codes, minlength=len(companies)))])
+    return companies, order, offsets
+
+
+def _assemble_results(
+    df: pd.DataFrame,
+    order: np.ndarray,
+    offsets: np.ndarray,
+    results: Dict[int, Tuple[np.ndarray, np.ndarray, Any]]
+) -> pd.DataFrame:
+    """会社ごとの結果を会社順に並べた位置へ書き戻し、クラスタID・代表名列を追加"""
+    cluster_ids = np.empty(len(df), dtype=int)
+    representative_names = np.empty(len(df), dtype=object)
+    for code in range(len(offsets) - 1):
+        rows = slice(offsets[code], offsets[code + 1])
+        company_ids, company_names, _ = results[code]
+        cluster_ids[rows] = company_ids
+        representative_names[rows] = company_names[company_ids - 1]
+
+    result_df = df.take(order).reset_index(drop=True)
+    result_df['クラスタID'] = cluster_ids
+    result_df['代表名'] = representative_names
+    logger.info(f"クラスタリング完了: 全{len(result_df)}件")
+
+    return result_df
+
+
+def _tfidf_vectorize(
+    texts: List[str],
+    weights: np.ndarray = None,
+    vectorizer: str = 'word',
+    ngram_range: Tuple[int, int] = (1, 3),
+    n_features: int = 2 ** 20,
+    chunk_size: int = 10000,
+    return_state: bool = False
+):
+    """
+    TF-IDFベクトル化
+
+    weights を指定した場合は各テキストが weights 件ずつ存在するものとして文書頻度を数え、
+    重複を展開して TfidfVectorizer を適用した場合と同じベクトルを返す。
+
+    vectorizer='char_hashing' の場合は文字n-gramを固定次元にハッシュする。
+    語彙を保持しないためメモリは一定で、チャンクごとに独立して変換できる。
+
+    Args:
+        texts: 前処理済みテキスト
+        weights: 各テキストの件数
+        vectorizer: word（単語トークン）/ char_hashing（文字n-gramハッシュ）
+        ngram_range: char_hashing の文字n-gram範囲
+        n_features: char_hashing の特徴量次元
+        chunk_size: char_hashing で一度に変換する件数
+        return_state: Trueの場合、新しいテキストを同じ空間に変換するための状態も返す
+
+    Returns:
+        L2正規化済みのTF-IDF行列（return_state=True の場合は (行列, 状態)）
+
+    Raises:
+        ValueError: 語彙が空の場合
+    """
+    state = {
+        'vectorizer': vectorizer,
+        'ngram_range': tuple(ngram_range),
+        'n_features': n_features,
+        'chunk_size': chunk_size
+    }
+
+    if vectorizer == 'char_hashing':
+        counts = _count_vectorize(texts, state)
+        if counts.nnz == 0:
+            raise ValueError("empty vocabulary; perhaps the documents only contain stop words")
+    else:
+        count_vectorizer = CountVectorizer(token_pattern=r'(?u)\b\w+\b', min_df=1)
+        counts = count_vectorizer.fit_transform(texts)
+        state['vocabulary'] = count_vectorizer.vocabulary_
+
+    if weights is None:
+        weights = np.ones(counts.shape[0])
+
+    # TfidfVectorizerの既定（smooth_idf=True）と同じIDF
+    n_documents = float(np.sum(weights))
+    doc_freq = (counts > 0).T.astype(float) @ weights
+    idf = np.log((1 + n_documents) / (1 + doc_freq)) + 1
+    matrix = normalize(counts @ sparse.diags(idf)).tocsr()
+
+    if not return_state:
+        return matrix
+
+    # 出現した特徴量のIDFのみ保持（未出現の特徴量は文書頻度0のIDF）
+    state['features'] = np.flatnonzero(doc_freq)
+    state['idf'] = idf[state['features']]
+    state['default_idf'] = np.log(1 + n_documents) + 1
+    return matrix, state
+
+
+def _count_vectorize(texts: List[str], state: Dict[str, Any]) -> sparse.csr_matrix:
+    """ベクトル化状態に従って出現回数行列を作成"""
+    if state['vectorizer'] == 'char_hashing':
+        hasher = HashingVectorizer(
+            analyzer='char',
+            ngram_range=tuple(state['ngram_range']),
+            n_features=state['n_features'],
+            alternate_sign=False,
+            norm=None
+        )
+        chunk_size = state['chunk_size']
+        return sparse.vstack([
+            hasher.transform(texts[start:start + chunk_size])
+            for start in range(0, len(texts), chunk_size)
+        ], format='csr')
+
+    count_vectorizer = CountVectorizer(token_pattern=r'(?u)\b\w+\b', vocabulary=state['vocabulary'])
+    return count_vectorizer.transform(texts).tocsr()
+
+
+def _tfidf_transform(texts: List[str], state: Dict[str, Any], count_unknown: bool = False) -> sparse.csr_matrix:
+    """
+    学習済みのベクトル化状態で新しいテキストをTF-IDFベクトルに変換
+
+    Args:
+        texts: 前処理済みテキスト
+        state: _tfidf_vectorize(return_state=True) が返した状態
+        count_unknown: 語彙にない単語も（未出現語のIDFで）行のノルムに含める
+                       語彙にない単語は特徴量にならないため、除いて正規化すると既存の語だけで
+                       類似度が過大になる（既存クラスタとの一致判定に使う）
+
+    Returns:
+        L2正規化済みのTF-IDF行列（count_unknown=True の場合、語彙にない単語の分だけノルムが1未満）
+    """
+    counts = _count_vectorize(texts, state)
+    idf = np.full(counts.shape[1], state['default_idf'])
+    idf[state['features']] = state['idf']
+    weighted = (counts @ sparse.diags(idf)).tocsr()
+    if not count_unknown or 'vocabulary' not in state:
+        return normalize(weighted).tocsr()
+
+    vocabulary = state['vocabulary']
+    analyzer = CountVectorizer(token_pattern=r'(?u)\b\w+\b').build_analyzer()
+    unknown = np.array([
+        sum(count * count for count in Counter(
+            token for token in analyzer(text) if token not in vocabulary
+        ).values())
+        for text in texts
+    ], dtype=float)
+    norms = np.sqrt(np.asarray(weighted.multiply(weighted).sum(axis=1)).ravel() + unknown * state['default_idf'] ** 2)
+    scale = np.divide(1, norms, out=np.zeros(len(norms)), where=norms > 0)
+    return (sparse.diags(scale) @ weighted).tocsr()
+
+
+def _cluster_centroids(
+    tfidf_matrix: sparse.csr_matrix,
+    labels: np.ndarray,
+    weights: np.ndarray = None,
+    n_clusters: int = None
+) -> Tuple[sparse.csr_matrix, np.ndarray]:
+    """
+    クラスタごとのTF-IDF重心（件数で重み付けした平均ベクトル）と件数を計算
+
+    Args:
+        tfidf_matrix: L2正規化済みのTF-IDF行列
+        labels: 0始まりのクラスタラベル
+        weights: 各行の件数
+        n_clusters: クラスタ数（省略時はラベルの最大値+1、行のないクラスタの重心は0）
+
+    Returns:
+        (重心行列（クラスタ数 × 特徴量数）, クラスタごとの件数)
+    """
+    if weights is None:
+        weights = np.ones(len(labels))
+    if n_clusters is None:
+        n_clusters = labels.max() + 1
+    membership = sparse.csr_matrix(
+        (np.asarray(weights, dtype=float), (labels, np.arange(len(labels)))),
+        shape=(n_clusters, len(labels))
+    )
+    sizes = np.bincount(labels, weights=weights, minlength=n_clusters)
+    scale = np.divide(1, sizes, out=np.zeros(n_clusters), where=sizes > 0)
+    centroids = sparse.diags(scale) @ (membership @ tfidf_matrix)
+    return centroids.tocsr(), sizes
+
+
+def _condensed_cosine_distances(tfidf_matrix, chunk_size: int, out: np.ndarray = None) -> np.ndarray:
+    """
+    コサイン距離をcondensed形式（float32）で直接計算
+
+    L2正規化した行を行チャンクごとに掛け合わせ、上三角部分だけを1次元配列に書き込む。
+    n×nの類似度行列・距離行列は作らない。
+
+    Args:
+        tfidf_matrix: TF-IDF行列
+        chunk_size: 1回に処理する行数
+        out: 書き込み先（長さ n(n-1)/2 のfloat32配列、numpy.memmap も可。省略時は新規に確保）
+
+    Returns:
+        condensed形式の距離（長さ n(n-1)/2、float32）
+    """
+    vectors = normalize(tfidf_matrix).tocsr().astype(np.float32)
+    n_samples = vectors.shape[0]
+    condensed = out if out is not None else np.empty(n_samples * (n_samples - 1) // 2, dtype=np.float32)
+
+    offset = 0
+    for start in range(0, n_samples, chunk_size):
+        stop = min(start + chunk_size, n_samples)
+        # チャンク行 × 自分以降の全行（上三角を含む部分だけ）
+        block = (vectors[start:stop] @ vectors[start:].T).toarray()
+        for i in range(stop - start):
+            length = n_samples - start - i - 1
+            np.subtract(1, block[i, i + 1:], out=condensed[offset:offset + length])
+            offset += length
+        if isinstance(condensed, np.memmap):
+            # 書き込み済みのページをディスクへ書き出し、常駐メモリを増やさない
+            condensed.flush()
+
+    return condensed
+
+
+def _estimate_dense_bytes(n_samples: int, weighted: bool, chunk_size: int) -> int:
+    """
+    denseエンジンの1社あたりのおおよそのピークメモリ（バイト）
+
+    condensed距離（float32）に加え、重みなしの場合はscipy linkage内部の
+    float64コピー、および距離計算チャンク分を見積もる
+    （重み付きは最近傍チェーン法で距離をその場で更新するため追加のコピーはない）。
+    """
+    n_pairs = n_samples * (n_samples - 1) // 2
+    bytes_per_pair = 4 if weighted else 4 + 8
+    return n_pairs * bytes_per_pair + min(chunk_size, n_samples) * n_samples * 4
+
+
+def _with_empty_marker(tfidf_matrix) -> sparse.csr_matrix:
+    """
+    空ベクトル行にマーカー列を追加
+
+    正規化後に空文字列となった行はTF-IDFが全て0になりコサイン距離を定義できないため、
+    専用の列を1つ追加して空行同士を同一、その他の行とは無関係として扱う。
+    """
+    tfidf_matrix = sparse.csr_matrix(tfidf_matrix)
+    empty = (np.diff(tfidf_matrix.indptr) == 0).astype(tfidf_matrix.dtype)
+    return sparse.hstack([tfidf_matrix, sparse.csr_matrix(empty).T], format='csr')
+
+
+def _sparse_average_linkage(graph: sparse.csr_matrix, weights: np.ndarray = None) -> np.ndarray:
+    """
+    近傍グラフ上のaverage linkage
+
+    グラフの辺を持つクラスタ対のみを併合候補とし、辺のない要素対の距離は1とみなす。
+    これは「辺のない要素対の距離を1に置き換えた距離行列」に対する厳密なaverage linkageと
+    一致するため、併合距離は単調非減少になる。
+
+    Args:
+        graph: コサイン類似度を値に持つ対称な隣接行列
+        weights: 各要素の件数（重複をまとめた場合、省略時は全て1）
+
+    Returns:
+        scipy形式のlinkage行列
+    """
+    n_samples = graph.shape[0]
+    n_nodes = 2 * n_samples - 1
+    graph = graph.tocoo()
+
+    neighbors = [dict() for _ in range(n_nodes)]
+    heap = []
+    for i, j, sim in zip(graph.row.tolist(), graph.col.tolist(), graph.data.tolist()):
+        if i < j:
+            dist = max(0.0, 1.0 - sim)
+            neighbors[i][j] = dist
+            neighbors[j][i] = dist
+            heap.append((dist, i, j))
+    heapq.heapify(heap)
+
+    size = np.ones(n_nodes)
+    if weights is not None:
+        size[:n_samples] = weights
+    active = np.zeros(n_nodes, dtype=bool)
+    active[:n_samples] = True
+    linkages = np.zeros((n_samples - 1, 4))
+    isolated = None
+
+    for node in range(n_samples, n_nodes):
+        while heap and not (active[heap[0][1]] and active[heap[0][2]]):
+            heapq.heappop(heap)
+
+        if heap:
+            dist, i, j = heapq.heappop(heap)
+        else:
+            # 辺が残っていない（非連結）場合は残ったクラスタを距離1で順に併合
+            if isolated is None:
+                isolated = np.flatnonzero(active).tolist()
+            i, j = isolated.pop(), isolated.pop()
+            dist = 1.0
+
+        n_i, n_j = size[i], size[j]
+        size[node] = n_i + n_j
+        active[i] = active[j] = False
+        active[node] = True
+        linkages[node - n_samples] = (i, j, dist, size[node])
+
+        near_i, near_j = neighbors[i], neighbors[j]
+        merged = neighbors[node]
+        for other in (near_i.keys() | near_j.keys()) - {i, j}:
+            merged_dist = (n_i * near_i.get(other, 1.0) + n_j * near_j.get(other, 1.0)) / (n_i + n_j)
+            merged[other] = merged_dist
+            near_other = neighbors[other]
+            near_other.pop(i, None)
+            near_other.pop(j, None)
+            near_other[node] = merged_dist
+            heapq.heappush(heap, (merged_dist, other, node))
+        neighbors[i] = neighbors[j] = None
+
+        if isolated is not None:
+            isolated.append(node)
+
+    return linkages
+
+
+def _merge_block_linkages(
+    block_linkages: List[np.ndarray],
+    block_members: List[np.ndarray],
+    n_samples: int,
+    weights: np.ndarray = None
+) -> np.ndarray:
+    """
+    ブロックごとのデンドログラムを1つのlinkage行列に統合
+
+    全ブロックの併合を距離順に並べてクラスタIDを振り直し、最後に各ブロックの根を
+    距離1（ブロック間は無関係）で順に併合する。
+
+    Args:
+        block_linkages: ブロックごとのscipy形式linkage行列（ブロック内の番号）
+        block_members: ブロックごとの要素番号
+        n_samples: 全要素数
+        weights: 各要素の件数
+
+    Returns:
+        全要素のscipy形式linkage行列
+    """
+    node_size = np.zeros(2 * n_samples - 1)
+    node_size[:n_samples] = weights if weights is not None else 1
+
+    # ブロック内の番号 → 全体の番号
+    node_maps = [
+        np.concatenate([members, np.full(len(members) - 1, -1)])
+        for members in block_members
+    ]
+
+    dists = np.concatenate([block_linkage[:, 2] for block_linkage in block_linkages])
+    block_ids = np.concatenate([np.full(len(z), b) for b, z in enumerate(block_linkages)]).astype(int)
+    local_steps = np.concatenate([np.arange(len(z)) for z in block_linkages]).astype(int)
+    order = np.lexsort((local_steps, block_ids, dists))
+
+    linkages = np.zeros((n_samples - 1, 4))
+    step = 0
+    for block_id, local_step in zip(block_ids[order], local_steps[order]):
+        a, b, dist = block_linkages[block_id][local_step, :3]
+        node_map = node_maps[block_id]
+        a, b = sorted((node_map[int(a)], node_map[int(b)]))
+        node = n_samples + step
+        node_size[node] = node_size[a] + node_size[b]
+        linkages[step] = (a, b, dist, node_size[node])
+        node_map[len(block_members[block_id]) + local_step] = node
+        step += 1
+
+    # 各ブロックの根を距離1で順に併合
+    roots = [node_map[-1] for node_map in node_maps]
+    join_dist = max(1.0, linkages[:step, 2].max()) if step else 1.0
+    current = roots[0]
+    for root in roots[1:]:
+        node = n_samples + step
+        a, b = sorted((current, root))
+        node_size[node] = node_size[a] + node_size[b]
+        linkages[step] = (a, b, join_dist, node_size[node])
+        current = node
+        step += 1
+
+    return linkages
+
+
+def _representative_names(
+    labels: np.ndarray,
+    names: List[str],
+    tfidf_matrix=None
+) -> np.ndarray:
+    """
+    クラスタごとの代表名を一括で求める
+
+    tfidf_matrix を省略した場合は最頻出の作業名称（同数の場合は辞書順で最小、
+    Series.mode().iloc[0] と同じ）を、指定した場合はクラスタのTF-IDF重心に
+    最も近い行（メドイド）の作業名称を代表名とする。
+    どちらもクラスタ数によらず一括の集計で計算する。
+
+    Args:
+        labels: 0始まりのクラスタラベル
+        names: 作業名称
+        tfidf_matrix: TF-IDF行列（メドイド選択時）
+
+    Returns:
+        クラスタラベル順の代表名配列
+    """
+    labels = np.asarray(labels)
+    names = np.asarray(names, dtype=object)
+    n_samples = len(labels)
+    n_clusters = labels.max() + 1
+
+    # 既定値: 各クラスタの先頭行の作業名称
+    _, first_rows = np.unique(labels, return_index=True)
+    representatives = names[first_rows]
+
+    if tfidf_matrix is not None:
+        # 各行と所属クラスタの重心との内積を、クラスタ内ベクトル和との内積として一括計算
+        vectors = normalize(tfidf_matrix).tocsr()
+        n_features = vectors.shape[1]
+        membership = sparse.csr_matrix(
+            (np.ones(n_samples), (labels, np.arange(n_samples))),
+            shape=(n_clusters, n_samples)
+        )
+        sums = (membership @ vectors).tocsr()
+        sums.sort_indices()
+        sum_keys = np.repeat(np.arange(n_clusters), np.diff(sums.indptr)) * n_features + sums.indices
+
+        row_of_entry = np.repeat(np.arange(n_samples), np.diff(vectors.indptr))
+        entry_keys = labels[row_of_entry] * n_features + vectors.indices
+        weights = vectors.data * sums.data[np.searchsorted(sum_keys, entry_keys)]
+        scores = np.bincount(row_of_entry, weights=weights, minlength=n_samples)
 
-            company_df['代表名'] = company_df['クラスタID'].map(representative_names)
+        # クラスタ内でスコア最大（同点は先頭）の行を選ぶ
+        best = np.lexsort((np.arange(n_samples), -scores, labels))
+        first = np.r_[True, labels[best][1:] != labels[best][:-1]]
+        representatives[labels[best][first]] = names[best][first]
+        return representatives
 
-            result_dfs.append(company_df)
-            logger.info(f"{company}: 完了 ({n_clusters}クラスタ)")
+    # (クラスタ, 作業名称コード) の組ごとに件数を数え、クラスタ内の最頻値を選ぶ
+    name_codes, uniques = pd.factorize(names, sort=True)
+    valid = name_codes >= 0
+    if len(uniques) == 0:
+        return representatives
 
-        # 全ての会社のデータを結合
-        result_df = pd.concat(result_dfs, ignore_index=True)
-        logger.info(f"クラスタリング完了: 全{len(result_df)}件")
+    pair_keys, counts = np.unique(labels[valid] * len(uniques) + name_codes[valid], return_counts=True)
+    pair_labels = pair_keys // len(uniques)
+    pair_codes = pair_keys % len(uniques)
 
-        return result_df
+    best = np.lexsort((pair_codes, -counts, pair_labels))
+    first = np.r_[True, pair_labels[best][1:] != pair_labels[best][:-1]]
+    representatives[pair_labels[best][first]] = np.asarray(uniques, dtype=object)[pair_codes[best][first]]
+    return representatives
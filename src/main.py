@@ -13,6 +13,7 @@ Usage:
 import sys
 import argparse
 import logging
+import multiprocessing
 from pathlib import Path
 from config_handler import ConfigHandler
 from logger import setup_logger
@@ -31,6 +32,9 @@ def parse_args():
   python main.py
   python main.py --config config.yaml
   python main.py --input data.csv --output result
+  python main.py --workers 8
+  python main.py --model model                 # クラスタリングしてモデルを保存
+  python main.py --assign --model model        # 保存済みモデルの既存クラスタへ割り当て
         '''
     )
 
@@ -53,6 +57,24 @@ def parse_args():
         help='出力ファイル接頭辞（config.yamlの設定を上書き）'
     )
 
+    parser.add_argument(
+        '--workers',
+        type=int,
+        help='クラスタリングの並列プロセス数（0: CPUコア数、config.yamlの設定を上書き）'
+    )
+
+    parser.add_argument(
+        '--model',
+        type=str,
+        help='クラスタリングモデルの保存先フォルダ（config.yamlのmodel_pathを上書き）'
+    )
+
+    parser.add_argument(
+        '--assign',
+        action='store_true',
+        help='再クラスタリングせず、保存済みモデルの既存クラスタへ新しいオーダーを割り当てる'
+    )
+
     return parser.parse_args()
 
 
@@ -105,18 +127,42 @@ def main():
         df = CSVReader.read_csv(input_path)
 
         # 2. 前処理
-        preprocessing_config = config.get('preprocessing', {})
+        preprocessing_config = dict(config.get('preprocessing') or {})
+        phrase_cache_dir = preprocessing_config.get('phrase_cache_dir')
+        if phrase_cache_dir and not Path(phrase_cache_dir).is_absolute():
+            preprocessing_config['phrase_cache_dir'] = str(Path(__file__).parent.parent / phrase_cache_dir)
         preprocessor = TextPreprocessor(preprocessing_config)
 
         logger.info("前処理を開始します...")
-        df['正規化テキスト'] = preprocessor.preprocess_batch(df['作業名称'].tolist())
+        df['正規化テキスト'] = preprocessor.preprocess_batch(df['作業名称'])
 
         # 3. クラスタリング
-        clustering_config = config.get('clustering', {})
-        clustering = DataClustering(clustering_config)
-
-        logger.info("クラスタリングを開始します...")
-        result_df = clustering.cluster_by_company(df, '正規化テキスト')
+        clustering_config = dict(config.get('clustering') or {})
+        if args.workers is not None:
+            clustering_config['workers'] = args.workers
+        model_path = args.model or clustering_config.get('model_path')
+        if model_path:
+            model_path = Path(model_path)
+            if not model_path.is_absolute():
+                model_path = Path(__file__).parent.parent / model_path
+            clustering_config['model_path'] = str(model_path)
+        cache_dir = clustering_config.get('cache_dir')
+        if cache_dir and not Path(cache_dir).is_absolute():
+            clustering_config['cache_dir'] = str(Path(__file__).parent.parent / cache_dir)
+        scratch_dir = clustering_config.get('scratch_dir')
+        if scratch_dir and not Path(scratch_dir).is_absolute():
+            clustering_config['scratch_dir'] = str(Path(__file__).parent.parent / scratch_dir)
+        clustering = DataClustering(clustering_config, preprocessing_config)
+
+        if args.assign:
+            if not model_path:
+                logger.error("--assign にはモデルの保存先（--model または config.yamlのmodel_path）が必要です。")
+                return 1
+            logger.info("既存クラスタへの割り当てを開始します...")
+            result_df = clustering.assign_by_company(df, '正規化テキスト')
+        else:
+            logger.info("クラスタリングを開始します...")
+            result_df = clustering.cluster_by_company(df, '正規化テキスト')
 
         # 正規化テキスト列を削除（出力CSVには含めない）
         result_df = result_df.drop(columns=['正規化テキスト'])
@@ -157,4 +203,6 @@ def main():
 
 
 if __name__ == "__main__":
+    # PyInstallerでexe化した場合にプロセスプールを使うために必要
+    multiprocessing.freeze_support()
     sys.exit(main())
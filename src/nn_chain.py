@@ -0,0 +1,263 @@
+"""
+最近傍チェーン法によるaverage linkageモジュール
+
+condensed形式（float32）の距離をその場で更新しながら併合を進めるため、
+距離配列以外の作業メモリは O(n) に収まる（scipy linkage のような float64 コピーや n×n 行列を作らない）。
+numba がインストールされている場合は併合ループを初回使用時にJITコンパイルして実行する。
+denseエンジンでは重み付き（重複をまとめた要素）とディスク上の距離に使い、重みなしのメモリ上の距離は scipy linkage で計算する。
+"""
+
+import logging
+import sys
+from typing import List, Tuple
+
+import numpy as np
+
+try:
+    import numba
+except ImportError:  # numba は任意（なくてもNumPy版で動作する）
+    numba = None
+
+logger = logging.getLogger(__name__)
+
+
+def average_linkage(condensed: np.ndarray, weights: np.ndarray = None, use_numba: bool = None) -> np.ndarray:
+    """
+    average linkage（最近傍チェーン法）
+
+    weights を指定した場合は各要素を weights 件の同一行の集まりとみなす。
+    同一行同士は距離0で先に併合されるため、元の全行に対する average linkage と
+    同じ併合距離になる（距離0の併合を除く）。
+
+    Args:
+        condensed: condensed形式の距離（float32推奨、numpy.memmap も可。上書きされる）
+        weights: 各要素の件数（省略時は全て1）
+        use_numba: numba版を使う（省略時はインストールされていれば使う）
+
+    Returns:
+        scipy形式のlinkage行列（併合距離の昇順）
+    """
+    n_samples = int(round((1 + np.sqrt(1 + 8 * len(condensed))) / 2)) if weights is None else len(weights)
+    if weights is None:
+        weights = np.ones(n_samples)
+    size = np.asarray(weights, dtype=np.float64).copy()
+
+    if n_samples <= 1:
+        return np.zeros((0, 4))
+
+    nn_chain_jit = None
+    if use_numba or use_numba is None:
+        if numba is None and use_numba:
+            raise ImportError("numba is not installed")
+        nn_chain_jit = _jit_nn_chain(strict=bool(use_numba))
+
+    if nn_chain_jit is not None:
+        merges = nn_chain_jit(np.asarray(condensed), size)
+    else:
+        merges = _nn_chain_numpy(condensed, size)
+
+    return _to_scipy_linkage(merges, weights)
+
+
+def _nn_chain_numpy(dist: np.ndarray, size: np.ndarray) -> List[Tuple[int, int, float]]:
+    """
+    最近傍チェーン法の併合ループ（NumPy版）
+
+    1要素の全距離を1回のベクトル演算で読み書きする。
+    チェーンの開始要素・同距離の扱い・併合後の番号は scipy の実装と同じにしているため、
+    同じ距離に対して scipy と同じ併合順になる。
+
+    Args:
+        dist: condensed形式の距離（上書きされる）
+        size: 各要素の件数（上書きされる）
+
+    Returns:
+        併合順の (併合される要素, 併合後の要素, 併合距離) のリスト
+    """
+    n_samples = len(size)
+    others = np.arange(n_samples)
+    row_starts = others * n_samples - others * (others + 1) // 2 - others - 1
+
+    def row_index(x):
+        # 要素 x と他の全要素（x 自身を除く）の condensed 上の位置
+        lower = others[:x]
+        upper = others[x + 1:]
+        return np.concatenate([row_starts[lower] + x, row_starts[x] + upper])
+
+    def row_values(x):
+        values = np.full(n_samples, np.inf)
+        values[others != x] = dist[row_index(x)]
+        values[~is_active] = np.inf
+        return values
+
+    merges = []
+    chain = []
+    first_active = 0
+    is_active = np.ones(n_samples, dtype=bool)
+
+    while len(merges) < n_samples - 1:
+        if not chain:
+            while not is_active[first_active]:
+                first_active += 1
+            chain.append(first_active)
+
+        while True:
+            x = chain[-1]
+            values = row_values(x)
+            y = int(np.argmin(values))
+            # 同距離の場合はチェーンの直前の要素を優先（ループ防止）
+            if len(chain) > 1 and values[chain[-2]] <= values[y]:
+                y = chain[-2]
+                break
+            chain.append(y)
+
+        # 番号の小さい方を削除し、大きい方の位置に併合後のクラスタを置く（scipyと同じ規約）
+        x, y = sorted((chain.pop(), chain.pop()))
+        values_x = row_values(x)
+        values_y = row_values(y)
+        merges.append((x, y, values_x[y]))
+
+        merged = (size[x] * values_x + size[y] * values_y) / (size[x] + size[y])
+        dist[row_index(y)] = merged[others != y]
+        size[y] += size[x]
+        is_active[x] = False
+
+    return merges
+
+
+def _nn_chain_loop(dist, size):
+    """
+    最近傍チェーン法の併合ループ（numba用のスカラー版）
+
+    NumPy版と同じ手順・同じ同距離の扱いで併合する。numba がない環境ではテスト用途のみ。
+
+    Args:
+        dist: condensed形式の距離（上書きされる）
+        size: 各要素の件数（上書きされる）
+
+    Returns:
+        併合順の (併合される要素, 併合後の要素, 併合距離) の配列（n-1 × 3）
+    """
+    n_samples = size.shape[0]
+    merges = np.empty((n_samples - 1, 3))
+    chain = np.empty(n_samples, dtype=np.int64)
+    is_active = np.ones(n_samples, dtype=np.bool_)
+    chain_length = 0
+    first_active = 0
+
+    for step in range(n_samples - 1):
+        if chain_length == 0:
+            while not is_active[first_active]:
+                first_active += 1
+            chain[0] = first_active
+            chain_length = 1
+
+        while True:
+            x = chain[chain_length - 1]
+            y = -1
+            best = np.inf
+            for j in range(n_samples):
+                if j == x or not is_active[j]:
+                    continue
+                if j < x:
+                    value = dist[n_samples * j - j * (j + 1) // 2 + x - j - 1]
+                else:
+                    value = dist[n_samples * x - x * (x + 1) // 2 + j - x - 1]
+                if value < best:
+                    best = value
+                    y = j
+            # 同距離の場合はチェーンの直前の要素を優先（ループ防止）
+            if chain_length > 1:
+                previous = chain[chain_length - 2]
+                if previous < x:
+                    value = dist[n_samples * previous - previous * (previous + 1) // 2 + x - previous - 1]
+                else:
+                    value = dist[n_samples * x - x * (x + 1) // 2 + previous - x - 1]
+                if value <= best:
+                    break
+            chain[chain_length] = y
+            chain_length += 1
+
+        # 番号の小さい方を削除し、大きい方の位置に併合後のクラスタを置く（scipyと同じ規約）
+        x = min(chain[chain_length - 1], chain[chain_length - 2])
+        y = max(chain[chain_length - 1], chain[chain_length - 2])
+        chain_length -= 2
+
+        if x < y:
+            merge_distance = dist[n_samples * x - x * (x + 1) // 2 + y - x - 1]
+        else:
+            merge_distance = dist[n_samples * y - y * (y + 1) // 2 + x - y - 1]
+        merges[step, 0] = x
+        merges[step, 1] = y
+        merges[step, 2] = merge_distance
+
+        total = size[x] + size[y]
+        for k in range(n_samples):
+            if k == x or k == y or not is_active[k]:
+                continue
+            xk = n_samples * x - x * (x + 1) // 2 + k - x - 1 if x < k else n_samples * k - k * (k + 1) // 2 + x - k - 1
+            yk = n_samples * y - y * (y + 1) // 2 + k - y - 1 if y < k else n_samples * k - k * (k + 1) // 2 + y - k - 1
+            dist[yk] = (size[x] * dist[xk] + size[y] * dist[yk]) / total
+        size[y] = total
+        is_active[x] = False
+
+    return merges
+
+
+_nn_chain_jit = None
+
+
+def _jit_nn_chain(strict: bool = False):
+    """
+    numba版の併合ループを取得（初回使用時にJITコンパイルし、import時には何もしない）
+
+    PyInstaller でまとめた実行ファイルではコンパイル結果をキャッシュに書き込めないため、
+    キャッシュを使わずにコンパイルする。
+
+    Args:
+        strict: コンパイルできない場合に例外を送出する（False: Noneを返しNumPy版で計算）
+
+    Returns:
+        JITコンパイルした関数（numba がない・コンパイルできない場合はNone）
+    """
+    global _nn_chain_jit
+    if _nn_chain_jit is None and numba is not None:
+        try:
+            _nn_chain_jit = numba.njit(cache=not getattr(sys, 'frozen', False))(_nn_chain_loop)
+        except Exception as e:
+            if strict:
+                raise
+            logger.warning(f"numbaによるコンパイルに失敗したため、NumPy版で計算します: {e}")
+            return None
+    return _nn_chain_jit
+
+
+def _to_scipy_linkage(merges, weights: np.ndarray) -> np.ndarray:
+    """
+    併合順の結果を併合距離順に並べ替え、scipy形式のクラスタIDに振り直す
+
+    浮動小数点の誤差で併合距離の順序が併合順と前後する場合があるため、
+    scipy と同様に安定ソート後、Union-Findで各要素が属するクラスタIDを求める。
+    """
+    n_samples = len(weights)
+    merges = sorted(((int(x), int(y), float(d)) for x, y, d in merges), key=lambda merge: merge[2])
+    parent = np.arange(2 * n_samples - 1)
+    node_size = np.concatenate([np.asarray(weights, dtype=float), np.zeros(n_samples - 1)])
+
+    def find(node):
+        root = node
+        while parent[root] != root:
+            root = parent[root]
+        while parent[node] != root:
+            parent[node], node = root, parent[node]
+        return root
+
+    linkages = np.zeros((n_samples - 1, 4))
+    for step, (x, y, merge_distance) in enumerate(merges):
+        a, b = sorted((find(x), find(y)))
+        node = n_samples + step
+        parent[a] = parent[b] = node
+        node_size[node] = node_size[a] + node_size[b]
+        linkages[step] = (a, b, merge_distance, node_size[node])
+
+    return linkages
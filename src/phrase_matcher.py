@@ -0,0 +1,221 @@
+"""
+フレーズ照合モジュール
+
+フェーズ名・略語などの固定文字列の辞書を Aho-Corasick オートマトンに変換し、
+辞書の大きさに関係なく1回の線形走査で除去・置換する。
+構築済みのオートマトンは辞書の内容をキーにpickleでディスクへキャッシュできる。
+"""
+
+import hashlib
+import json
+import logging
+import os
+import pickle
+import tempfile
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# オートマトンの構造を変更した場合に上げる（古いキャッシュを無効化する）
+MATCHER_VERSION = 1
+
+
+class PhraseMatcher:
+    """Aho-Corasick 法による複数フレーズの置換クラス"""
+
+    def __init__(self, phrases: Dict[str, str], ignore_case: bool = False, word_boundary: bool = False):
+        """
+        初期化（オートマトンを構築）
+
+        Args:
+            phrases: フレーズ → 置換文字列 の辞書（除去の場合は空文字列）
+            ignore_case: 大文字・小文字を区別しない
+            word_boundary: 前後が英数字・文字でない位置のみ一致とする（正規表現の \\b 相当）
+        """
+        self.ignore_case = ignore_case
+        self.word_boundary = word_boundary
+        self.size = 0
+
+        # 状態ごとの遷移・失敗遷移・出力（(フレーズ長, 置換文字列) を長い順）
+        self._goto: List[Dict[str, int]] = [{}]
+        self._fail: List[int] = [0]
+        self._out: List[List[Tuple[int, str]]] = [[]]
+
+        for phrase, replacement in phrases.items():
+            if phrase:
+                self._add(self._fold(phrase), replacement)
+        self._build_fail_links()
+
+    def _fold(self, text: str) -> str:
+        """照合用に文字列を変換（文字数は変えない）"""
+        if not self.ignore_case:
+            return text
+        folded = text.lower()
+        if len(folded) == len(text):
+            return folded
+        return ''.join(c if len(c.lower()) != 1 else c.lower() for c in text)
+
+    def _add(self, phrase: str, replacement: str):
+        """フレーズをトライに追加（同じフレーズは先の登録を優先）"""
+        node = 0
+        for char in phrase:
+            next_node = self._goto[node].get(char)
+            if next_node is None:
+                next_node = len(self._goto)
+                self._goto[node][char] = next_node
+                self._goto.append({})
+                self._fail.append(0)
+                self._out.append([])
+            node = next_node
+        if not self._out[node]:
+            self._out[node].append((len(phrase), replacement))
+            self.size += 1
+
+    def _build_fail_links(self):
+        """幅優先で失敗遷移を設定し、接尾辞の出力を併合"""
+        queue = list(self._goto[0].values())
+        for node in queue:
+            for char, child in self._goto[node].items():
+                fail = self._fail[node]
+                while fail and char not in self._goto[fail]:
+                    fail = self._fail[fail]
+                target = self._goto[fail].get(char, 0)
+                self._fail[child] = target if target != child else 0
+                self._out[child] = self._out[child] + self._out[self._fail[child]]
+                queue.append(child)
+
+    def _at_boundary(self, text: str, start: int, end: int) -> bool:
+        """一致範囲の前後が単語の区切りか"""
+        if start > 0 and _is_word_char(text[start - 1]):
+            return False
+        return end >= len(text) or not _is_word_char(text[end])
+
+    def matches(self, text: str) -> Dict[int, Tuple[int, str]]:
+        """
+        一致候補を検索
+
+        Args:
+            text: 対象テキスト
+
+        Returns:
+            開始位置 → (終了位置, 置換文字列) の辞書（各開始位置で最長の一致）
+        """
+        goto, fail, out = self._goto, self._fail, self._out
+        found = {}
+        node = 0
+        for end, char in enumerate(self._fold(text), 1):
+            while node and char not in goto[node]:
+                node = fail[node]
+            node = goto[node].get(char, 0)
+            for length, replacement in out[node]:
+                start = end - length
+                if self.word_boundary and not self._at_boundary(text, start, end):
+                    continue
+                # 同じ開始位置では後から見つかる一致ほど長い
+                found[start] = (end, replacement)
+        return found
+
+    def sub(self, text: str, extra: Iterable[Tuple[int, int, str]] = ()) -> str:
+        """
+        一致したフレーズを置換
+
+        左から順に、各位置で最長の一致を重ならないように採用する。
+
+        Args:
+            text: 対象テキスト
+            extra: 辞書以外の一致候補 (開始位置, 終了位置, 置換文字列)（正規表現パターンの一致など）
+
+        Returns:
+            置換後のテキスト
+        """
+        found = self.matches(text)
+        for start, end, replacement in extra:
+            if end > found.get(start, (start, ''))[0]:
+                found[start] = (end, replacement)
+        if not found:
+            return text
+
+        parts = []
+        position = 0
+        for start in sorted(found):
+            if start < position:
+                continue
+            end, replacement = found[start]
+            parts.append(text[position:start])
+            parts.append(replacement)
+            position = end
+        parts.append(text[position:])
+        return ''.join(parts)
+
+    def save(self, path: Path):
+        """オートマトンをpickleで保存（一時ファイルに書き出してから置き換える）"""
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=path.parent, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                pickle.dump(self, f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp_path, path)
+        except BaseException:
+            os.unlink(tmp_path)
+            raise
+
+    @staticmethod
+    def load(path: Path) -> 'PhraseMatcher':
+        """pickleからオートマトンを読み込み"""
+        with open(path, 'rb') as f:
+            matcher = pickle.load(f)
+        if not isinstance(matcher, PhraseMatcher):
+            raise ValueError(f"PhraseMatcherではありません: {path}")
+        return matcher
+
+    @classmethod
+    def cached(
+        cls,
+        phrases: Dict[str, str],
+        cache_dir: Optional[Path] = None,
+        ignore_case: bool = False,
+        word_boundary: bool = False
+    ) -> 'PhraseMatcher':
+        """
+        辞書の内容をキーにキャッシュしたオートマトンを取得（なければ構築して保存）
+
+        Args:
+            phrases: フレーズ → 置換文字列 の辞書
+            cache_dir: キャッシュフォルダ（None: キャッシュしない）
+            ignore_case: 大文字・小文字を区別しない
+            word_boundary: 単語の区切りでのみ一致とする
+
+        Returns:
+            PhraseMatcher
+        """
+        if cache_dir is None:
+            return cls(phrases, ignore_case, word_boundary)
+
+        key = hashlib.sha256(json.dumps(
+            [MATCHER_VERSION, list(phrases.items()), ignore_case, word_boundary],
+            ensure_ascii=False
+        ).encode('utf-8')).hexdigest()
+        path = Path(cache_dir) / f"phrases-{key}.pkl"
+
+        if path.exists():
+            try:
+                matcher = cls.load(path)
+                logger.debug(f"フレーズ辞書キャッシュ読み込み: {path}")
+                return matcher
+            except (OSError, pickle.UnpicklingError, EOFError, AttributeError, ValueError) as e:
+                logger.warning(f"フレーズ辞書キャッシュを読み込めません（再構築します）: {path}: {e}")
+
+        matcher = cls(phrases, ignore_case, word_boundary)
+        try:
+            matcher.save(path)
+            logger.info(f"フレーズ辞書キャッシュ保存: {path}（{matcher.size}語）")
+        except OSError as e:
+            logger.warning(f"フレーズ辞書キャッシュを保存できません: {path}: {e}")
+        return matcher
+
+
+def _is_word_char(char: str) -> bool:
+    """正規表現の \\w と同じ判定"""
+    return char.isalnum() or char == '_'
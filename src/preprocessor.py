@@ -11,12 +11,28 @@
 6. 略語正規化
 """
 
+import itertools
 import re
 import logging
-from typing import Dict, Any
+from collections import OrderedDict
+from typing import Dict, Any, List, Optional, Union
+
+import numpy as np
+import pandas as pd
+
+from phrase_matcher import PhraseMatcher
 
 logger = logging.getLogger(__name__)
 
+# パターンの字句（エスケープ・文字クラス・量指定子・1文字）
+_PATTERN_TOKEN = re.compile(r'\\.|\[[^\]]*\]|\{[\d,]+\}|.')
+_REGEX_METACHARACTERS = set('.^$*+?{}[]()|\\')
+
+# 記号除去の対象文字（symbol_pattern と同じ集合: 記号と \s に一致する空白文字）
+_SYMBOL_CODES = [ord(c) for c in '／/-－―‐【】[]()（）「」『』、。，．,.'] + [
+    code for code in range(0x10000) if chr(code).isspace()
+]
+
 
 class TextPreprocessor:
     """テキスト前処理クラス"""
@@ -30,98 +46,154 @@ class TextPreprocessor:
         """
         self.config = config
         self._compile_patterns()
+
+        # 前処理結果のLRUキャッシュ（元テキストがキー。設定はインスタンスごとに固定のためキーに含めない）
+        self.memo_size = int(config.get('memo_size', 100000))
+        self._memo = OrderedDict()
+        self.memo_hits = 0
+        self.memo_misses = 0
+        self.memo_evictions = 0
         logger.info("TextPreprocessor initialized")
 
     def _compile_patterns(self):
         """正規表現パターンをコンパイル"""
 
         # 時期情報パターン（半角・全角両対応）
-        self.period_patterns = [
+        # 段階ごとに1回ずつ走査する（同じ段階では長いパターンを優先、段階は上から順に適用）
+        self.period_pattern_tiers = [
             # 年度パターン
-            r'FY\d{4}',
-            r'ＦＹ\d{4}',
-            r'FY\d{2}',
-            r'ＦＹ\d{2}',
-            r'令和\d+年度?',
-            r'平成\d+年度?',
-            r'令和元年度?',
-            r'\d{4}年度?',
-            r'\d+年度',
+            [
+                r'FY\d{4}',
+                r'ＦＹ\d{4}',
+                r'FY\d{2}',
+                r'ＦＹ\d{2}',
+                r'令和\d+年度?',
+                r'平成\d+年度?',
+                r'令和元年度?',
+                r'\d{4}年度?',
+            ],
+            # 4桁の年度の後に適用（「32024年度」は「2024年度」のみ除去）
+            [
+                r'\d+年度',
+            ],
             # 月度パターン
-            r'\d+月度',
-            r'\d+月',
+            [
+                r'\d+月度',
+                r'\d+月',
+            ],
             # 四半期パターン
-            r'\d+Q',
-            r'\d+Ｑ',
-            r'第\d+四半期',
-            r'[1-4]Q',
-            r'[１-４]Ｑ',
+            [
+                r'\d+Q',
+                r'\d+Ｑ',
+                r'第\d+四半期',
+                r'[1-4]Q',
+                r'[１-４]Ｑ',
+            ],
         ]
+        self.period_patterns = [pattern for tier in self.period_pattern_tiers for pattern in tier]
 
         # フェーズ情報パターン（半角・全角、英語・日本語）
-        self.phase_patterns = [
-            # 日本語フェーズ
-            r'要件定義',
-            r'基本設計',
-            r'詳細設計',
-            r'外部設計',
-            r'内部設計',
-            r'開発',
-            r'実装',
-            r'製造',
-            r'プログラミング',
-            r'単体テスト',
-            r'結合テスト',
-            r'総合テスト',
-            r'システムテスト',
-            r'受入テスト',
-            r'テスト',
-            r'移行',
-            r'リリース',
-            r'保守',
-            r'運用',
-            r'運用保守',
-            r'PMO',
-            r'プロジェクト管理',
-            # 英語・略称
-            r'RequirementDefinition',
-            r'Requirement',
-            r'BasicDesign',
-            r'DetailedDesign',
-            r'Design',
-            r'Development',
-            r'Implementation',
-            r'Programming',
-            r'Coding',
-            r'UnitTest',
-            r'IntegrationTest',
-            r'SystemTest',
-            r'Test',
-            r'Migration',
-            r'Maintenance',
-            r'Operation',
-            r'O&M',
-            # 略称（フェーズ）
-            r'要[件定]',
-            r'基[本設]',
-            r'詳[細設]',
-            r'外[部設]',
-            r'内[部設]',
-            r'BD',
-            r'DD',
-            r'PG',
-            r'ST',
-            r'IT',
-            r'UT',
-            # フェーズ番号
-            r'フェーズ\d+',
-            r'Phase\d+',
-            r'P\d+',
+        # 完全な語を除去してから略称を除去する（「APITest」の「IT」が「Test」より先に一致しないように）
+        self.phase_pattern_tiers = [
+            [
+                # 日本語フェーズ
+                r'要件定義',
+                r'基本設計',
+                r'詳細設計',
+                r'外部設計',
+                r'内部設計',
+                r'開発',
+                r'実装',
+                r'製造',
+                r'プログラミング',
+                r'単体テスト',
+                r'結合テスト',
+                r'総合テスト',
+                r'システムテスト',
+                r'受入テスト',
+                r'テスト',
+                r'移行',
+                r'リリース',
+                r'保守',
+                r'運用',
+                r'運用保守',
+                r'PMO',
+                r'プロジェクト管理',
+                # 英語・略称
+                r'RequirementDefinition',
+                r'Requirement',
+                r'BasicDesign',
+                r'DetailedDesign',
+                r'Design',
+                r'Development',
+                r'Implementation',
+                r'Programming',
+                r'Coding',
+                r'UnitTest',
+                r'IntegrationTest',
+                r'SystemTest',
+                r'Test',
+                r'Migration',
+                r'Maintenance',
+                r'Operation',
+                r'O&M',
+            ],
+            [
+                # 略称（フェーズ）
+                r'要[件定]',
+                r'基[本設]',
+                r'詳[細設]',
+                r'外[部設]',
+                r'内[部設]',
+                r'BD',
+                r'DD',
+                r'PG',
+                r'ST',
+                r'IT',
+                r'UT',
+            ],
+            # 略称の除去で現れる番号（「PDD1」→「P1」）も除去するため最後に適用
+            [
+                # フェーズ番号
+                r'フェーズ\d+',
+                r'Phase\d+',
+                r'P\d+',
+            ],
         ]
 
+        # 顧客固有のフェーズ名（固定文字列、完全な語として扱う）
+        self.phase_pattern_tiers[0] += [re.escape(term) for term in self.config.get('extra_phase_terms') or []]
+        self.phase_patterns = [pattern for tier in self.phase_pattern_tiers for pattern in tier]
+
+        # 段階ごとに1つの選択パターンにまとめ、1回の走査で除去する
+        self.period_regexes = [_compile_alternation(tier) for tier in self.period_pattern_tiers]
+
+        # フェーズ名のうち固定文字列に展開できるものは辞書照合、残り（番号付きなど）は正規表現
+        cache_dir = self.config.get('phrase_cache_dir') or None
+        self.phase_tiers = []
+        for tier in self.phase_pattern_tiers:
+            phase_terms = {}
+            phase_regex_patterns = []
+            for pattern in tier:
+                expanded = _expand_literal(pattern)
+                if expanded is None:
+                    phase_regex_patterns.append(pattern)
+                else:
+                    phase_terms.update((term, '') for term in expanded if term not in phase_terms)
+            self.phase_tiers.append((
+                PhraseMatcher.cached(phase_terms, cache_dir, ignore_case=True) if phase_terms else None,
+                _compile_alternation(phase_regex_patterns) if phase_regex_patterns else None
+            ))
+
         # 記号・装飾パターン（長音記号「ー」を除外）
         self.symbol_pattern = r'[／/\-－―‐\【】\[\]\(\)（）「」『』、。，．,\.\s]+'
 
+        # 文字単位の変換表（str.translate はC実装で1回の走査）
+        # 記号除去 → 半角→全角 の順に続けて適用する場合は1つの表にまとめる
+        self.symbol_table = dict.fromkeys(_SYMBOL_CODES)
+        self.width_table = {code: code + 0xFEE0 for code in range(0x21, 0x7F)}
+        self.symbol_width_table = {**self.width_table, **self.symbol_table}
+
         # 略語正規化マップ
         self.abbreviation_map = {
             'S': 'システム',
@@ -160,6 +232,8 @@ class TextPreprocessor:
             'ＡＰＰ': 'アプリ',
             'APP': 'アプリ',
         }
+        self.abbreviation_map.update(self.config.get('extra_abbreviations') or {})
+        self.abbreviation_matcher = PhraseMatcher.cached(self.abbreviation_map, cache_dir, word_boundary=True)
 
     def preprocess(self, text: str) -> str:
         """
@@ -181,7 +255,25 @@ class TextPreprocessor:
         """
         if not isinstance(text, str):
             return ""
+        if self.memo_size <= 0:
+            return self._preprocess(text)
+
+        result = self._memo.get(text)
+        if result is not None:
+            self._memo.move_to_end(text)
+            self.memo_hits += 1
+            return result
+
+        result = self._preprocess(text)
+        self.memo_misses += 1
+        self._memo[text] = result
+        if len(self._memo) > self.memo_size:
+            self._memo.popitem(last=False)
+            self.memo_evictions += 1
+        return result
 
+    def _preprocess(self, text: str) -> str:
+        """テキスト前処理の本体（キャッシュなし）"""
         result = text
 
         # 1. スペース削除
@@ -197,11 +289,14 @@ class TextPreprocessor:
             result = self._remove_phase(result)
 
         # 4. 記号・装飾除去（長音記号を保護）
-        if self.config.get('remove_symbols', True):
-            result = self._remove_symbols(result)
-
         # 5. 半角→全角変換
-        if self.config.get('normalize_width', True):
+        remove_symbols = self.config.get('remove_symbols', True)
+        normalize_width = self.config.get('normalize_width', True)
+        if remove_symbols and normalize_width:
+            result = result.translate(self.symbol_width_table)
+        elif remove_symbols:
+            result = self._remove_symbols(result)
+        elif normalize_width:
             result = self._normalize_width(result)
 
         # 6. 略語正規化
@@ -216,55 +311,126 @@ class TextPreprocessor:
 
     def _remove_period(self, text: str) -> str:
         """時期情報を除去"""
-        result = text
-        for pattern in self.period_patterns:
-            result = re.sub(pattern, '', result, flags=re.IGNORECASE)
-        return result
+        for regex in self.period_regexes:
+            text = regex.sub('', text)
+        return text
 
     def _remove_phase(self, text: str) -> str:
         """フェーズ情報を除去"""
-        result = text
-        for pattern in self.phase_patterns:
-            result = re.sub(pattern, '', result, flags=re.IGNORECASE)
-        return result
+        for matcher, regex in self.phase_tiers:
+            if matcher is None:
+                text = regex.sub('', text)
+                continue
+            extra = ()
+            if regex is not None:
+                extra = [(m.start(), m.end(), '') for m in regex.finditer(text)]
+            text = matcher.sub(text, extra)
+        return text
 
     def _remove_symbols(self, text: str) -> str:
         """記号・装飾を除去（長音記号「ー」は保護）"""
-        return re.sub(self.symbol_pattern, '', text)
+        return text.translate(self.symbol_table)
 
     def _normalize_width(self, text: str) -> str:
-        """半角→全角変換"""
-        # 半角英数字・記号を全角に変換
-        result = []
-        for char in text:
-            code = ord(char)
-            # 半角英数字・記号の範囲（0x21-0x7E）を全角に変換
-            if 0x21 <= code <= 0x7E:
-                result.append(chr(code + 0xFEE0))
-            else:
-                result.append(char)
-        return ''.join(result)
+        """半角→全角変換（半角英数字・記号の範囲 0x21-0x7E を全角に変換）"""
+        return text.translate(self.width_table)
 
     def _normalize_abbreviations(self, text: str) -> str:
-        """略語を正規化"""
-        result = text
-        for abbr, full in self.abbreviation_map.items():
-            # 単語境界でマッチング（前後に英数字がない）
-            pattern = r'\b' + re.escape(abbr) + r'\b'
-            result = re.sub(pattern, full, result)
-        return result
+        """略語を正規化（単語境界でマッチング: 前後に英数字がない）"""
+        return self.abbreviation_matcher.sub(text)
 
-    def preprocess_batch(self, texts: list) -> list:
+    def preprocess_batch(self, texts: Union[list, pd.Series]) -> Union[list, pd.Series]:
         """
         複数のテキストを一括前処理
 
+        列を factorize してユニークな値だけを正規化し、整数コードで全行に展開する。
+
         Args:
-            texts: テキストのリスト
+            texts: テキストのリストまたはSeries
 
         Returns:
-            正規化されたテキストのリスト
+            正規化されたテキスト（Seriesを渡した場合は同じindexのカテゴリ型Series、リストの場合はリスト）
         """
         logger.info(f"前処理開始: {len(texts)}件")
-        results = [self.preprocess(text) for text in texts]
-        logger.info(f"前処理完了: {len(results)}件")
-        return results
+        hits, misses, evictions = self.memo_hits, self.memo_misses, self.memo_evictions
+
+        codes, uniques = pd.factorize(np.asarray(texts, dtype=object))
+        normalized = [self.preprocess(text) for text in uniques]
+        if (codes < 0).any():
+            # 欠損値（コード -1）は末尾の空文字列に対応させる
+            normalized.append("")
+        category_codes, categories = pd.factorize(np.asarray(normalized, dtype=object))
+        results = pd.Categorical.from_codes(category_codes[codes], categories)
+        logger.info(f"前処理完了: {len(results)}件（ユニーク {len(uniques)}件）")
+
+        if self.memo_size > 0:
+            hits = self.memo_hits - hits
+            lookups = hits + self.memo_misses - misses
+            hit_rate = hits / lookups * 100 if lookups else 0.0
+            # 行はユニークな値にまとめてから前処理するため、ヒット率は以前のバッチで処理済みの値の割合
+            logger.info(
+                f"前処理キャッシュ: ユニーク値のヒット率 {hit_rate:.1f}%（{hits}/{lookups}件）、"
+                f"追い出し {self.memo_evictions - evictions}件、保持 {len(self._memo)}/{self.memo_size}件"
+            )
+
+        if isinstance(texts, pd.Series):
+            return pd.Series(results, index=texts.index, name=texts.name)
+        return results.tolist()
+
+
+def _compile_alternation(patterns: List[str]) -> re.Pattern:
+    """
+    パターンのリストを1つの選択パターンにコンパイル
+
+    同じ位置では長い候補を優先するよう、固定部分の文字数の降順（同じ長さはリスト順）に並べる。
+    これにより「運用保守」は「運用」＋「保守」ではなく1語として除去される。
+
+    Args:
+        patterns: 正規表現パターンのリスト
+
+    Returns:
+        IGNORECASE付きでコンパイルした選択パターン
+    """
+    order = sorted(range(len(patterns)), key=lambda i: (-_pattern_length(patterns[i]), i))
+    return re.compile('|'.join(f'(?:{patterns[i]})' for i in order), re.IGNORECASE)
+
+
+def _pattern_length(pattern: str) -> int:
+    """パターンの固定部分のおおよその文字数（エスケープ・文字クラスは1文字、量指定子は数えない）"""
+    tokens = _PATTERN_TOKEN.findall(pattern)
+    return sum(1 for token in tokens if token not in ('+', '*', '?') and not token.startswith('{'))
+
+
+def _expand_literal(pattern: str, limit: int = 64) -> Optional[List[str]]:
+    """
+    文字と文字クラス（[件定] など）だけのパターンを固定文字列の一覧に展開
+
+    Args:
+        pattern: 正規表現パターン
+        limit: 展開する文字列数の上限
+
+    Returns:
+        一致し得る文字列の一覧（展開できない場合はNone）
+    """
+    choices = []
+    for token in _PATTERN_TOKEN.findall(pattern):
+        if token.startswith('\\'):
+            # \d などの特殊シーケンスは展開できない（re.escape による記号のエスケープのみ可）
+            if token[1:].isalnum():
+                return None
+            choices.append([token[1:]])
+        elif token.startswith('[') and len(token) > 2:
+            members = token[1:-1]
+            if members[0] == '^' or '-' in members or '\\' in members:
+                return None
+            choices.append(list(dict.fromkeys(members)))
+        elif token in _REGEX_METACHARACTERS or token.startswith('{'):
+            return None
+        else:
+            choices.append([token])
+    count = 1
+    for chars in choices:
+        count *= len(chars)
+    if not choices or count > limit:
+        return None
+    return [''.join(chars) for chars in itertools.product(*choices)]
@@ -0,0 +1,144 @@
+"""
+結果キャッシュモジュール
+
+会社ごとのクラスタリング結果（クラスタID・代表名）を内容のハッシュをキーに保存し、
+前回の実行から入力・設定が変わっていない会社の再計算を省略する
+"""
+
+import hashlib
+import json
+import logging
+import os
+from pathlib import Path
+from typing import Any, Optional, Tuple
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# 結果の計算方法を変更した場合に上げる（古いキャッシュを無効化する）
+CACHE_VERSION = 1
+
+
+class ResultCache:
+    """会社単位のクラスタリング結果キャッシュ"""
+
+    def __init__(self, cache_dir: Path, max_size_mb: float = 512):
+        """
+        初期化
+
+        Args:
+            cache_dir: キャッシュフォルダ
+            max_size_mb: キャッシュ全体の上限サイズ（MB、0以下: 無制限）
+        """
+        self.cache_dir = Path(cache_dir)
+        self.max_size_mb = float(max_size_mb)
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @staticmethod
+    def make_key(*parts: Any) -> str:
+        """
+        キャッシュキー（SHA-256）を作成
+
+        文字列のリスト・配列は区切り文字で連結し、それ以外はJSONに変換してハッシュする。
+
+        Args:
+            parts: キーに含める値（テキスト一覧、設定の辞書など）
+
+        Returns:
+            16進数のハッシュ文字列
+        """
+        digest = hashlib.sha256(f"v{CACHE_VERSION}".encode())
+        for part in parts:
+            if isinstance(part, (list, tuple, np.ndarray)):
+                encoded = '\x1f'.join(str(value) for value in part).encode('utf-8')
+            else:
+                encoded = json.dumps(part, sort_keys=True, ensure_ascii=False, default=str).encode('utf-8')
+            digest.update(len(encoded).to_bytes(8, 'little'))
+            digest.update(encoded)
+        return digest.hexdigest()
+
+    def _path(self, key: str) -> Path:
+        return self.cache_dir / f"{key}.npz"
+
+    def get(self, key: str) -> Optional[Tuple[np.ndarray, np.ndarray]]:
+        """
+        キャッシュから結果を取得
+
+        Args:
+            key: キャッシュキー
+
+        Returns:
+            (クラスタID, クラスタID順の代表名配列)（キャッシュにない場合はNone）
+        """
+        path = self._path(key)
+        try:
+            with np.load(path) as data:
+                result = data['cluster_ids'], data['representative_names']
+        except (OSError, KeyError, ValueError):
+            self.misses += 1
+            return None
+
+        # 最近使った結果を残すよう更新日時を更新
+        os.utime(path)
+        self.hits += 1
+        return result
+
+    def put(self, key: str, cluster_ids: np.ndarray, representative_names: np.ndarray):
+        """
+        結果をキャッシュに保存
+
+        Args:
+            key: キャッシュキー
+            cluster_ids: クラスタID（1始まり）
+            representative_names: クラスタID順の代表名配列
+        """
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        path = self._path(key)
+        work_path = path.with_suffix('.tmp')
+        with open(work_path, 'wb') as f:
+            np.savez(
+                f,
+                cluster_ids=np.asarray(cluster_ids),
+                representative_names=np.asarray(representative_names).astype(str)
+            )
+        os.replace(work_path, path)
+
+    def evict(self) -> int:
+        """
+        上限サイズを超えた分を、最後に使った日時が古い順に削除
+
+        Returns:
+            削除した件数
+        """
+        if self.max_size_mb <= 0 or not self.cache_dir.exists():
+            return 0
+
+        entries = []
+        for path in self.cache_dir.glob('*.npz'):
+            stat = path.stat()
+            entries.append((stat.st_mtime, stat.st_size, path))
+
+        total_size = sum(size for _, size, _ in entries)
+        limit = self.max_size_mb * 1024 ** 2
+        removed = 0
+        for _, size, path in sorted(entries):
+            if total_size <= limit:
+                break
+            path.unlink()
+            total_size -= size
+            removed += 1
+
+        self.evictions += removed
+        return removed
+
+    def log_summary(self):
+        """ヒット・ミス・削除件数をログ出力"""
+        total = self.hits + self.misses
+        hit_rate = self.hits / total if total else 0.0
+        logger.info(
+            f"結果キャッシュ: ヒット {self.hits}社, ミス {self.misses}社 "
+            f"(ヒット率 {hit_rate:.1%}), 削除 {self.evictions}件"
+        )
@@ -0,0 +1,154 @@
+"""
+会社単位の並列実行スケジューラ
+
+会社の件数は偏りが大きい（少数の巨大な会社と多数の小さな会社）ため、次のように振り分ける。
+
+- 巨大な会社: 大きな距離行列をワーカーへ転送しないよう、メインプロセスの別スレッドで1社ずつ実行する
+- その他の会社: 件数の合計が batch_rows 程度になるようにまとめ、バッチ単位でプロセスプールに投入する
+  （プロセス間通信の回数を減らす。ワーカー内のBLASは1スレッドに制限してコアの取り合いを防ぐ）
+- 巨大な会社の実行中もバッチを並行して実行する（巨大な会社がある場合、メインプロセスが1コアを使うため
+  プロセスプールは workers - 1 プロセス）
+- 同時に実行するジョブの見積もりメモリ（n² に比例）の合計が memory_limit_mb を超えないように投入を待つ
+"""
+
+import logging
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, ThreadPoolExecutor, wait
+from typing import Any, Callable, Dict, List, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+class HybridScheduler:
+    """件数に応じて単独実行・バッチ並列実行を振り分けるスケジューラ"""
+
+    def __init__(
+        self,
+        workers: int,
+        giant_rows: int = 20000,
+        batch_rows: int = 2000,
+        memory_limit_mb: float = 0,
+        executor_class=ProcessPoolExecutor
+    ):
+        """
+        初期化
+
+        Args:
+            workers: ワーカープロセス数
+            giant_rows: この件数以上の会社はメインプロセスで単独実行（0以下: 単独実行しない）
+            batch_rows: 1バッチにまとめる件数の目安
+            memory_limit_mb: 同時に実行するバッチの見積もりメモリの上限（MB、0以下: 無制限）
+            executor_class: バッチを実行するExecutor（テスト用に差し替え可能）
+        """
+        self.workers = max(1, int(workers))
+        self.giant_rows = int(giant_rows)
+        self.batch_rows = max(1, int(batch_rows))
+        self.memory_limit_mb = float(memory_limit_mb)
+        self.executor_class = executor_class
+
+    def plan(self, sizes: Dict[int, int]) -> Tuple[List[int], List[List[int]]]:
+        """
+        単独実行する会社とバッチを決定
+
+        Args:
+            sizes: 会社番号 → 件数
+
+        Returns:
+            (単独実行する会社番号, バッチ（会社番号のリスト）のリスト)。いずれも件数の多い順
+        """
+        order = sorted(sizes, key=lambda code: (-sizes[code], code))
+        giants = [code for code in order if 0 < self.giant_rows <= sizes[code]]
+
+        batches = []
+        batch, batch_size = [], 0
+        for code in order:
+            if 0 < self.giant_rows <= sizes[code]:
+                continue
+            batch.append(code)
+            batch_size += sizes[code]
+            if batch_size >= self.batch_rows:
+                batches.append(batch)
+                batch, batch_size = [], 0
+        if batch:
+            batches.append(batch)
+
+        return giants, batches
+
+    def run(
+        self,
+        sizes: Dict[int, int],
+        estimate_bytes: Callable[[int], float],
+        run_single: Callable[[int], Any],
+        batch_function: Callable[[List[Any]], List[Any]],
+        batch_args: Callable[[int], Any]
+    ) -> Dict[int, Any]:
+        """
+        全社を実行
+
+        Args:
+            sizes: 会社番号 → 件数
+            estimate_bytes: 件数 → 見積もりメモリ（バイト）
+            run_single: メインプロセスで1社を実行する関数（会社番号 → 結果、バッチの実行と並行して別スレッドで呼ばれる）
+            batch_function: ワーカープロセスで1バッチを実行する関数（引数のリスト → 結果のリスト、pickle可能であること）
+            batch_args: 会社番号 → batch_function に渡す1社分の引数
+
+        Returns:
+            会社番号 → 結果
+        """
+        giants, batches = self.plan(sizes)
+        logger.info(
+            f"並列実行: {self.workers}プロセス（単独実行 {len(giants)}社, バッチ {len(batches)}件）"
+        )
+
+        if not batches:
+            return {code: run_single(code) for code in giants}
+
+        results = {}
+        limit = self.memory_limit_mb * 1024 ** 2
+        waiting = [(batch, max(estimate_bytes(sizes[code]) for code in batch)) for batch in batches]
+        running = {}
+        used = 0.0
+        pool_workers = max(1, self.workers - 1) if giants else self.workers
+
+        with ThreadPoolExecutor(max_workers=1) as giant_executor, \
+                self.executor_class(max_workers=pool_workers, initializer=_limit_blas_threads) as executor:
+            if giants:
+                # 巨大な会社は1社ずつ順に実行し、その間もバッチをワーカーで実行する
+                future = giant_executor.submit(lambda: {code: run_single(code) for code in giants})
+                estimated = max(estimate_bytes(sizes[code]) for code in giants)
+                running[future] = (None, estimated)
+                used += estimated
+
+            while waiting or running:
+                while waiting and sum(batch is not None for batch, _ in running.values()) < pool_workers:
+                    # 上限に収まる最初のバッチを投入（実行中がなければ上限を超えても1件は投入）
+                    index = next(
+                        (i for i, (_, estimated) in enumerate(waiting)
+                         if not running or limit <= 0 or used + estimated <= limit),
+                        None
+                    )
+                    if index is None:
+                        break
+                    batch, estimated = waiting.pop(index)
+                    future = executor.submit(batch_function, [batch_args(code) for code in batch])
+                    running[future] = (batch, estimated)
+                    used += estimated
+
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    batch, estimated = running.pop(future)
+                    used -= estimated
+                    if batch is None:
+                        results.update(future.result())
+                    else:
+                        results.update(zip(batch, future.result()))
+
+        return results
+
+
+def _limit_blas_threads():
+    """ワーカープロセスのBLASスレッド数を1に制限（threadpoolctl がない場合は何もしない）"""
+    try:
+        from threadpoolctl import threadpool_limits
+    except ImportError:
+        return
+    threadpool_limits(limits=1)
@@ -0,0 +1,140 @@
+"""
+疎行列の上位k件コサイン類似度カーネル
+
+L2正規化済みのCSR行列について、各行の類似度上位k件（類似度の下限を超えるもの）を
+行チャンクごとの疎行列積で求める。n×nの結果は作らず、結果のメモリは O(n・k)、
+作業領域は1チャンク分の類似度（最大 chunk_size × n）に収まる。
+近傍グラフ・重複検出・最近傍クラスタの割り当てに共通で使う。
+"""
+
+from typing import Tuple
+
+import numpy as np
+from scipy import sparse
+from sklearn.preprocessing import normalize
+
+
+def top_k_cosine(
+    vectors: sparse.csr_matrix,
+    n_neighbors: int,
+    candidates: sparse.csr_matrix = None,
+    min_similarity: float = 0.0,
+    chunk_size: int = 1000
+) -> sparse.csr_matrix:
+    """
+    各行のコサイン類似度上位k件を求める
+
+    同じ類似度の場合は列番号の小さい方を優先する。
+
+    Args:
+        vectors: L2正規化済みのCSR行列（問い合わせ側）
+        n_neighbors: 各行が保持する件数k
+        candidates: L2正規化済みのCSR行列（候補側、省略時は vectors 同士で自分自身を除く）
+        min_similarity: 類似度の下限（この値より大きいもののみ保持）
+        chunk_size: 1回に処理する行数（作業領域は最大 chunk_size × 候補数 の類似度）
+
+    Returns:
+        行: vectors の行、列: candidates の行、値: コサイン類似度 の疎行列（各行最大k件）
+    """
+    exclude_self = candidates is None
+    if candidates is None:
+        candidates = vectors
+    vectors = sparse.csr_matrix(vectors)
+    candidates_t = sparse.csr_matrix(candidates).T.tocsc()
+    n_samples = vectors.shape[0]
+
+    rows, cols, sims = [], [], []
+    for start in range(0, n_samples, chunk_size):
+        block = (vectors[start:start + chunk_size] @ candidates_t).tocsr()
+        block_rows, block_cols, block_sims = _block_top_k(
+            block, n_neighbors, min_similarity, start if exclude_self else None
+        )
+        rows.append(block_rows + start)
+        cols.append(block_cols)
+        sims.append(block_sims)
+
+    return sparse.csr_matrix(
+        (np.concatenate(sims), (np.concatenate(rows), np.concatenate(cols))),
+        shape=(n_samples, candidates.shape[0])
+    )
+
+
+def knn_graph(vectors: sparse.csr_matrix, n_neighbors: int, chunk_size: int) -> sparse.csr_matrix:
+    """
+    上位k件のコサイン近傍グラフを構築
+
+    行をL2正規化し、各行の類似度上位k件（自分自身を除く、類似度 > 0）を辺とする。
+
+    Args:
+        vectors: 疎なTF-IDF行列
+        n_neighbors: 近傍数k
+        chunk_size: 1回に処理する行数
+
+    Returns:
+        コサイン類似度を値に持つ対称な隣接行列（CSR）
+    """
+    graph = top_k_cosine(normalize(vectors, norm='l2').tocsr(), n_neighbors, chunk_size=chunk_size)
+    return graph.maximum(graph.T).tocsr()
+
+
+def nearest_rows(
+    vectors: sparse.csr_matrix,
+    candidates: sparse.csr_matrix,
+    chunk_size: int
+) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    各行のコサイン類似度が最も高い候補行を求める
+
+    Args:
+        vectors: L2正規化済みのCSR行列
+        candidates: 候補の行列（この関数内でL2正規化する）
+        chunk_size: 1回に処理する行数
+
+    Returns:
+        (最も近い候補の番号, そのコサイン類似度)。類似度が正の候補がない行は (0, 0)
+    """
+    best = top_k_cosine(vectors, 1, normalize(candidates).tocsr(), chunk_size=chunk_size)
+    labels = np.zeros(best.shape[0], dtype=int)
+    similarities = np.zeros(best.shape[0])
+    has_match = np.diff(best.indptr) > 0
+    labels[has_match] = best.indices
+    similarities[has_match] = best.data
+    return labels, similarities
+
+
+def _block_top_k(block: sparse.csr_matrix, n_neighbors: int, min_similarity: float, self_offset: int = None):
+    """
+    1チャンク分の類似度（CSR）から各行の上位k件を行ごとに取り出す
+
+    全要素を並べ替えず、行ごとに np.partition でk番目の類似度を求めて選ぶ（行の非ゼロ数に比例）。
+    k番目と同じ類似度が複数ある場合は列番号の小さい方を残す。
+
+    Returns:
+        (チャンク内の行番号, 列番号, 類似度)
+    """
+    indptr, indices, data = block.indptr, block.indices, block.data
+    rows, cols, sims = [], [], []
+    for row in range(block.shape[0]):
+        row_cols = indices[indptr[row]:indptr[row + 1]]
+        row_sims = data[indptr[row]:indptr[row + 1]]
+
+        keep = row_sims > min_similarity
+        if self_offset is not None:
+            keep &= row_cols != row + self_offset
+        row_cols, row_sims = row_cols[keep], row_sims[keep]
+
+        if len(row_sims) > n_neighbors:
+            kth = np.partition(row_sims, len(row_sims) - n_neighbors)[len(row_sims) - n_neighbors]
+            above = row_sims > kth
+            tied = np.flatnonzero(row_sims == kth)
+            tied = tied[np.argsort(row_cols[tied], kind='stable')[:n_neighbors - np.count_nonzero(above)]]
+            selected = np.concatenate([np.flatnonzero(above), tied])
+            row_cols, row_sims = row_cols[selected], row_sims[selected]
+
+        rows.append(np.full(len(row_cols), row))
+        cols.append(row_cols)
+        sims.append(row_sims)
+
+    if not rows:
+        return np.zeros(0, dtype=int), np.zeros(0, dtype=block.indices.dtype), np.zeros(0, dtype=block.dtype)
+    return np.concatenate(rows), np.concatenate(cols), np.concatenate(sims)
@@ -0,0 +1,96 @@
+"""
+Cluster Count Module Tests
+
+テスト対象:
+- デンドログラムからのクラスタ数選択（gap / threshold / silhouette）
+- 標本化シルエット係数の計算
+"""
+
+import numpy as np
+import sys
+from pathlib import Path
+from scipy import sparse
+from scipy.cluster.hierarchy import linkage
+from sklearn.metrics import silhouette_score
+from sklearn.preprocessing import normalize
+
+# Add src to path for imports
+sys.path.insert(0, str(Path(__file__).parent.parent / 'src'))
+
+from cluster_count import (
+    cut_tree, gap_candidates, gap_count, sampled_silhouette, silhouette_count, threshold_count
+)
+
+
+def _grouped_vectors():
+    """3つのはっきりしたグループを持つベクトル（各4行）"""
+    rng = np.random.default_rng(0)
+    centers = np.eye(3, 6) * 5
+    points = np.repeat(centers, 4, axis=0) + rng.random((12, 6)) * 0.5
+    return sparse.csr_matrix(normalize(points))
+
+
+class TestClusterCount:
+    """クラスタ数選択関数のテスト"""
+
+    def test_gap_count(self):
+        """距離増加幅が最大の位置で切断したクラスタ数になることを確認"""
+        distances = np.array([0.1, 0.2, 0.3, 0.5, 0.8])
+        assert gap_count(distances) == 2
+        assert gap_count(np.array([0.4])) == 1
+
+    def test_threshold_count(self):
+        """閾値以下の併合だけを適用したクラスタ数になることを確認"""
+        distances = np.array([0.1, 0.2, 0.3, 0.5, 0.8])
+        assert threshold_count(distances, 0.3) == 3
+        assert threshold_count(distances, 0.05) == 6
+        assert threshold_count(distances, 1.0) == 1
+
+    def test_gap_candidates(self):
+        """増加幅の大きい順に制約内の候補が返ることを確認"""
+        distances = np.array([0.1, 0.2, 0.6, 0.65, 0.9])
+        assert gap_candidates(distances, 3, 2, 4) == [4, 2, 3]
+        assert gap_candidates(distances, 1, 2, 3) == [2]
+
+    def test_sampled_silhouette_matches_sklearn(self):
+        """全行を標本とした場合、sklearn の silhouette_score（コサイン距離）と一致することを確認"""
+        vectors = _grouped_vectors()
+        labels = cut_tree(linkage(vectors.toarray(), method='average', metric='cosine')[:, :2], 12, 3)
+
+        score = sampled_silhouette(vectors, labels, np.ones(12), np.arange(12))
+
+        assert np.isclose(score, silhouette_score(vectors.toarray(), labels, metric='cosine'))
+
+    def test_sampled_silhouette_with_unshared_clusters(self):
+        """語を共有しないクラスタが多い疎なデータでも sklearn の silhouette_score と一致することを確認"""
+        vectors = normalize(sparse.random(60, 40, density=0.05, random_state=3, format='csr')
+                            + sparse.eye(60, 40, format='csr')).tocsr()
+        labels = np.arange(60) % 15
+
+        score = sampled_silhouette(vectors, labels, np.ones(60), np.arange(60))
+
+        assert np.isclose(score, silhouette_score(vectors.toarray(), labels, metric='cosine'))
+
+    def test_silhouette_count_picks_true_groups(self):
+        """はっきりした3グループのデータで、シルエット係数が最大のクラスタ数3が選ばれることを確認"""
+        vectors = _grouped_vectors()
+        linkages = linkage(vectors.toarray(), method='average', metric='cosine')
+
+        assert silhouette_count(linkages, vectors, [2, 3, 4, 6]) == 3
+        assert silhouette_count(linkages, vectors, []) == 0
+
+    def test_cut_tree_matches_agglomerative_labels(self):
+        """切断ラベルが AgglomerativeClustering(linkage='average') の labels_ と番号まで一致することを確認"""
+        from sklearn.cluster import AgglomerativeClustering
+        from sklearn.metrics.pairwise import cosine_distances
+
+        rng = np.random.default_rng(1)
+        vectors = normalize(rng.random((40, 8)))
+        distances = cosine_distances(vectors)
+        children = linkage(vectors, method='average', metric='cosine')[:, :2]
+
+        for n_clusters in (1, 2, 3, 7, 20, 39, 40):
+            expected = AgglomerativeClustering(
+                n_clusters=n_clusters, metric='precomputed', linkage='average'
+            ).fit_predict(distances)
+            assert np.array_equal(cut_tree(children, 40, n_clusters), expected)
@@ -0,0 +1,127 @@
+"""
+Cluster Model Module Tests
+
+テスト対象:
+- クラスタリングモデルの保存・読み込み（.npy + JSONマニフェスト、メモリマップ）
+"""
+
+import json
+import pytest
+import numpy as np
+import sys
+from pathlib import Path
+from scipy import sparse
+
+# Add src to path for imports
+sys.path.insert(0, str(Path(__file__).parent.parent / 'src'))
+
+from cluster_model import ClusterModel
+
+
+class TestClusterModel:
+    """ClusterModel クラスのテスト"""
+
+    @pytest.fixture
+    def model(self):
+        """全社共通の語彙を持つモデル"""
+        return ClusterModel(
+            tfidf_state={
+                'vectorizer': 'word',
+                'ngram_range': (2, 3),
+                'n_features': 2 ** 20,
+                'chunk_size': 10000,
+                'vocabulary': {'在庫': 0, '人事': 1},
+                'features': np.array([0, 1]),
+                'idf': np.array([1.2, 1.5]),
+                'default_idf': 2.0
+            },
+            companies={
+                'A社': {
+                    'tfidf': None,
+                    'centroids': sparse.csr_matrix(np.array([[1.0, 0.0], [0.0, 0.5]])),
+                    'sizes': np.array([3.0, 2.0]),
+                    'representatives': np.array(['在庫管理', '人事'], dtype=object),
+                    'linkage': np.array([[0.0, 1.0, 0.8, 2.0]]),
+                    'leaf_texts': np.array(['在庫', '人事'], dtype=object)
+                }
+            }
+        )
+
+    def test_save_and_load(self, model, tmp_path):
+        """保存したモデルを読み込むと同じ内容になることを確認"""
+        model.save(tmp_path / 'model')
+        loaded = ClusterModel.load(tmp_path / 'model')
+
+        assert loaded.tfidf_state['vocabulary'] == {'在庫': 0, '人事': 1}
+        assert loaded.tfidf_state['ngram_range'] == (2, 3)
+        assert np.array_equal(loaded.tfidf_state['idf'], [1.2, 1.5])
+        entry = loaded.companies['A社']
+        assert np.array_equal(entry['centroids'].toarray(), [[1.0, 0.0], [0.0, 0.5]])
+        assert np.array_equal(entry['sizes'], [3.0, 2.0])
+        assert list(entry['representatives']) == ['在庫管理', '人事']
+        assert np.array_equal(entry['linkage'], [[0.0, 1.0, 0.8, 2.0]])
+        assert list(entry['leaf_texts']) == ['在庫', '人事']
+        # 会社ごとの状態がない場合は全社共通の状態を使う
+        assert loaded.tfidf_state_for('A社') is loaded.tfidf_state
+
+    def test_save_and_load_extensions(self, model, tmp_path):
+        """--assign で追加したクラスタ群が独自のベクトル化状態ごと保存・読み込みされることを確認"""
+        model.companies['A社']['extensions'] = [{
+            'tfidf': {**model.tfidf_state, 'vocabulary': {'物流': 0}, 'features': np.array([0]), 'idf': np.array([1.1])},
+            'centroids': sparse.csr_matrix(np.array([[1.0]])),
+            'sizes': np.array([2.0])
+        }]
+        model.save(tmp_path / 'model')
+        loaded = ClusterModel.load(tmp_path / 'model')
+
+        extensions = loaded.companies['A社']['extensions']
+        assert len(extensions) == 1
+        assert extensions[0]['tfidf']['vocabulary'] == {'物流': 0}
+        assert np.array_equal(extensions[0]['centroids'].toarray(), [[1.0]])
+        assert np.array_equal(extensions[0]['sizes'], [2.0])
+
+    def test_load_uses_memory_map(self, model, tmp_path):
+        """既定ではメモリマップで読み込まれ、mmap_mode=None ではメモリに読み込まれることを確認"""
+        model.save(tmp_path / 'model')
+
+        assert isinstance(ClusterModel.load(tmp_path / 'model').companies['A社']['linkage'], np.memmap)
+        assert not isinstance(
+            ClusterModel.load(tmp_path / 'model', mmap_mode=None).companies['A社']['linkage'], np.memmap
+        )
+
+    def test_manifest_lists_companies(self, model, tmp_path):
+        """マニフェストに会社名がそのまま記録されることを確認"""
+        manifest_path = model.save(tmp_path / 'model')
+
+        with open(manifest_path, encoding='utf-8') as f:
+            manifest = json.load(f)
+        assert manifest['companies']['A社']['n_clusters'] == 2
+
+    def test_load_missing(self, tmp_path):
+        """モデルがない場合は FileNotFoundError になることを確認"""
+        with pytest.raises(FileNotFoundError):
+            ClusterModel.load(tmp_path / 'missing')
+
+    def test_save_keeps_unrelated_files(self, model, tmp_path):
+        """上書き保存しても保存先フォルダ内のモデル以外のファイルが残ることを確認"""
+        model_dir = tmp_path / 'model'
+        model.save(model_dir)
+        (model_dir / 'important.csv').write_text('keep', encoding='utf-8')
+
+        model.companies['B社'] = model.companies['A社']
+        model.tfidf_state = None
+        model.save(model_dir)
+
+        assert (model_dir / 'important.csv').read_text(encoding='utf-8') == 'keep'
+        assert not (model_dir / 'tfidf').exists()
+        assert set(ClusterModel.load(model_dir).companies) == {'A社', 'B社'}
+        assert [p.name for p in tmp_path.iterdir()] == ['model']
+
+    def test_save_refuses_non_model_folder(self, model, tmp_path):
+        """モデル以外のファイルを含むフォルダへの保存は拒否されることを確認"""
+        (tmp_path / 'important.csv').write_text('keep', encoding='utf-8')
+
+        with pytest.raises(FileExistsError):
+            model.save(tmp_path)
+        assert (tmp_path / 'important.csv').exists()
+        assert not (tmp_path / ClusterModel.MANIFEST_FILE).exists()
@@ -17,7 +17,7 @@ from pathlib import Path
 # Add src to path for imports
 sys.path.insert(0, str(Path(__file__).parent.parent / 'src'))
 
-from clustering import DataClustering
+from clustering import DataClustering, _condensed_cosine_distances, _representative_names, _tfidf_vectorize
 
 
 class TestDataClustering:
@@ -333,3 +333,637 @@ class TestDataClustering:
 
         # 不正な設定タイプなのでデフォルト値が使用される
         assert result == default_count
+
+    # ========================================
+    # 追加テスト: 疎なk近傍グラフエンジン
+    # ========================================
+    def test_sparse_knn_engine(self, sample_dataframe):
+        """sparse_knnエンジンでも同じ出力列が付与されることを確認"""
+        clustering = DataClustering({'company_cluster_settings': {}, 'engine': 'sparse_knn', 'knn_neighbors': 3})
+        result_df = clustering.cluster_by_company(sample_dataframe, '正規化テキスト')
+
+        assert len(result_df) == len(sample_dataframe)
+        assert result_df['クラスタID'].notna().all()
+        assert result_df['代表名'].notna().all()
+        assert result_df['クラスタID'].min() >= 1
+
+    def test_sparse_knn_matches_dense_with_full_neighbors(self):
+        """近傍数が全件以上の場合、sparse_knnとdenseの分割が一致することを確認"""
+        df = pd.DataFrame({
+            'オーダーID': [f'ORD-{i:03d}' for i in range(1, 9)],
+            '会社名': ['テスト会社'] * 8,
+            '作業名称': [f'作業{i}' for i in range(1, 9)],
+            '正規化テキスト': [
+                '在庫 管理 システム',
+                '在庫 管理 システム 改修',
+                '在庫 管理',
+                '顧客 管理 システム',
+                '顧客 管理 基盤',
+                '人事 給与',
+                '人事 給与 システム',
+                '会計 基盤 刷新'
+            ]
+        })
+        dense = DataClustering({'company_cluster_settings': {}})
+        knn = DataClustering({'company_cluster_settings': {}, 'engine': 'sparse_knn', 'knn_neighbors': 100})
+
+        dense_ids = dense.cluster_by_company(df, '正規化テキスト')['クラスタID'].to_numpy()
+        knn_ids = knn.cluster_by_company(df, '正規化テキスト')['クラスタID'].to_numpy()
+
+        # ラベル番号ではなく同じ行同士が同じクラスタかどうかを比較
+        assert np.array_equal(dense_ids[:, None] == dense_ids, knn_ids[:, None] == knn_ids)
+
+    # ========================================
+    # 追加テスト: デンドログラム切断と再クラスタリングの一致
+    # ========================================
+    def test_dendrogram_cut_matches_refit(self, sample_dataframe):
+        """デンドログラム切断のクラスタIDがAgglomerativeClusteringの再計算と番号まで一致することを確認"""
+        data_path = Path(__file__).parent / 'data' / 'test_sample.csv'
+        csv_df = pd.read_csv(data_path, encoding='utf-8')
+        csv_df['正規化テキスト'] = csv_df['作業名称']
+
+        for df in (sample_dataframe, csv_df):
+            cut = DataClustering({'company_cluster_settings': {}, 'dendrogram_cut': True})
+            refit = DataClustering({'company_cluster_settings': {}, 'dendrogram_cut': False})
+
+            cut_df = cut.cluster_by_company(df, '正規化テキスト')
+            refit_df = refit.cluster_by_company(df, '正規化テキスト')
+
+            for company in df['会社名'].unique():
+                cut_ids = cut_df.loc[cut_df['会社名'] == company, 'クラスタID'].to_numpy()
+                refit_ids = refit_df.loc[refit_df['会社名'] == company, 'クラスタID'].to_numpy()
+                assert np.array_equal(cut_ids, refit_ids)
+
+    # ========================================
+    # 追加テスト: 並列実行
+    # ========================================
+    def test_parallel_workers_match_serial(self, sample_dataframe):
+        """プロセスプールでの並列実行結果が逐次実行と一致することを確認"""
+        serial = DataClustering({'company_cluster_settings': {}, 'workers': 1})
+        parallel = DataClustering({'company_cluster_settings': {}, 'workers': 2})
+
+        serial_df = serial.cluster_by_company(sample_dataframe, '正規化テキスト')
+        parallel_df = parallel.cluster_by_company(sample_dataframe, '正規化テキスト')
+
+        pd.testing.assert_frame_equal(serial_df, parallel_df)
+
+    # ========================================
+    # 追加テスト: 会社が混在した入力の並び順
+    # ========================================
+    def test_interleaved_companies_grouped_in_order(self, clustering, sample_dataframe):
+        """会社が交互に並んだ入力でも、会社の出現順・会社内の元の順で出力されることを確認"""
+        interleaved = sample_dataframe.iloc[[0, 5, 1, 6, 2, 7, 3, 8, 4, 9]].reset_index(drop=True)
+
+        result_df = clustering.cluster_by_company(interleaved, '正規化テキスト')
+
+        assert result_df['オーダーID'].tolist() == sample_dataframe['オーダーID'].tolist()
+        assert result_df.index.tolist() == list(range(len(sample_dataframe)))
+
+    # ========================================
+    # 追加テスト: 代表名の一括選択
+    # ========================================
+    def test_representative_names_match_mode(self):
+        """一括集計の代表名がクラスタごとのSeries.mode()と一致することを確認"""
+        rng = np.random.default_rng(0)
+        labels = rng.integers(0, 20, size=300)
+        labels[:20] = np.arange(20)
+        names = rng.choice(['在庫管理', '顧客管理', '人事給与', '会計', '基盤刷新'], size=300).tolist()
+
+        result = _representative_names(labels, names)
+
+        for label in range(20):
+            expected = pd.Series(names)[labels == label].mode().iloc[0]
+            assert result[label] == expected
+
+    def test_representative_names_medoid(self):
+        """medoid指定でクラスタ重心に最も近い作業名称が選ばれることを確認"""
+        from sklearn.feature_extraction.text import TfidfVectorizer
+
+        texts = ['在庫 管理', '在庫 管理 改修', '在庫 管理 改修 追加', '人事 給与']
+        names = ['A', 'B', 'C', 'D']
+        labels = np.array([0, 0, 0, 1])
+        tfidf_matrix = TfidfVectorizer(token_pattern=r'(?u)\b\w+\b').fit_transform(texts)
+
+        result = _representative_names(labels, names, tfidf_matrix)
+
+        assert result.tolist() == ['B', 'D']
+
+    def test_medoid_representative_option(self, sample_dataframe):
+        """representative: medoid でも代表名が作業名称から選ばれることを確認"""
+        clustering = DataClustering({'company_cluster_settings': {}, 'representative': 'medoid'})
+        result_df = clustering.cluster_by_company(sample_dataframe, '正規化テキスト')
+
+        assert result_df['代表名'].notna().all()
+        for _, cluster_rows in result_df.groupby(['会社名', 'クラスタID']):
+            assert cluster_rows['代表名'].iloc[0] in cluster_rows['作業名称'].values
+
+    # ========================================
+    # 追加テスト: 重複をまとめた重み付きクラスタリング
+    # ========================================
+    @pytest.mark.parametrize('engine', ['dense', 'sparse_knn'])
+    def test_collapse_duplicates_matches_rows(self, engine):
+        """重複をまとめても全行でクラスタリングした場合と同じ分割になることを確認"""
+        base_texts = [
+            '在庫 管理 システム',
+            '在庫 管理 システム 改修',
+            '在庫 管理',
+            '顧客 管理 システム',
+            '顧客 管理 基盤',
+            '人事 給与',
+            '人事 給与 システム',
+            '会計 基盤 刷新'
+        ]
+        texts = [base_texts[i] for i in [0, 1, 0, 2, 3, 0, 4, 5, 6, 5, 7, 3, 1, 6]]
+        df = pd.DataFrame({
+            'オーダーID': [f'ORD-{i:03d}' for i in range(len(texts))],
+            '会社名': ['テスト会社'] * len(texts),
+            '作業名称': texts,
+            '正規化テキスト': texts
+        })
+        config = {'company_cluster_settings': {}, 'engine': engine, 'knn_neighbors': 100}
+
+        rows_ids = DataClustering(config).cluster_by_company(df, '正規化テキスト')['クラスタID'].to_numpy()
+        collapsed_ids = DataClustering({**config, 'collapse_duplicates': True}).cluster_by_company(
+            df, '正規化テキスト')['クラスタID'].to_numpy()
+
+        assert np.array_equal(rows_ids[:, None] == rows_ids, collapsed_ids[:, None] == collapsed_ids)
+
+    def test_dense_linkage_uses_scipy_without_weights(self, clustering):
+        """重みなしのメモリ上の距離は scipy linkage、重み付きは最近傍チェーン法で計算することを確認"""
+        from unittest.mock import patch
+        import clustering as clustering_module
+
+        tfidf_matrix = _tfidf_vectorize(['在庫 管理', '在庫 管理 システム', '人事 給与', '人事'])
+        with patch.object(clustering_module, 'average_linkage', wraps=clustering_module.average_linkage) as spy:
+            unweighted = clustering._dense_linkage(tfidf_matrix)
+            assert spy.call_count == 0
+            weighted = clustering._dense_linkage(tfidf_matrix, weights=np.ones(4))
+            assert spy.call_count == 1
+
+        assert np.allclose(unweighted[:, 2], weighted[:, 2], atol=1e-6)
+
+    # ========================================
+    # 追加テスト: float32 condensed距離とメモリ上限
+    # ========================================
+    def test_condensed_cosine_distances(self):
+        """チャンク計算したcondensed距離が1 - コサイン類似度と一致することを確認"""
+        from scipy import sparse
+        from scipy.spatial.distance import squareform
+        from sklearn.metrics.pairwise import cosine_similarity
+
+        tfidf_matrix = sparse.random(23, 15, density=0.3, random_state=0, format='csr')
+
+        result = _condensed_cosine_distances(tfidf_matrix, chunk_size=4)
+        expected = squareform(1 - cosine_similarity(tfidf_matrix), checks=False)
+
+        assert result.dtype == np.float32
+        np.testing.assert_allclose(result, expected, atol=1e-6)
+
+    def test_memory_budget_fallback(self, sample_dataframe, caplog):
+        """メモリ上限を超える会社はsparse_knnで近似されることを確認"""
+        clustering = DataClustering({'company_cluster_settings': {}, 'memory_budget_mb': 1e-6})
+
+        with caplog.at_level('WARNING'):
+            result_df = clustering.cluster_by_company(sample_dataframe, '正規化テキスト')
+
+        assert 'sparse_knn' in caplog.text
+        assert len(result_df) == len(sample_dataframe)
+        assert result_df['クラスタID'].min() >= 1
+
+    def test_memory_budget_spills_to_disk(self, caplog, tmp_path):
+        """scratch_dir 設定時はメモリ上限を超える会社の距離をディスクに置き、メモリ上と同じ結果になることを確認"""
+        texts = [
+            '在庫 管理 システム 開発', '在庫 管理 システム 保守', '在庫 管理 改修',
+            '人事 給与 計算 対応', '人事 給与 計算', '会計 基盤 刷新 支援', '会計 基盤 刷新'
+        ]
+        df = pd.DataFrame({
+            'オーダーID': [f'ORD-{i:03d}' for i in range(len(texts))],
+            '会社名': ['テスト会社'] * len(texts),
+            '作業名称': texts,
+            '正規化テキスト': texts
+        })
+        config = {'company_cluster_settings': {'テスト会社': 3}}
+        on_disk = DataClustering({**config, 'memory_budget_mb': 1e-6, 'scratch_dir': str(tmp_path)})
+
+        with caplog.at_level('WARNING'):
+            disk_df = on_disk.cluster_by_company(df, '正規化テキスト')
+        memory_df = DataClustering(config).cluster_by_company(df, '正規化テキスト')
+
+        assert 'scratch_dir' in caplog.text
+        disk_ids = disk_df['クラスタID'].to_numpy()
+        memory_ids = memory_df['クラスタID'].to_numpy()
+        assert np.array_equal(disk_ids[:, None] == disk_ids, memory_ids[:, None] == memory_ids)
+        assert disk_df['代表名'].tolist() == memory_df['代表名'].tolist()
+        # 距離ファイルは計算後に削除される
+        assert list(tmp_path.iterdir()) == []
+
+    def test_disk_linkage_error_is_not_masked(self, tmp_path):
+        """ディスク上の距離でlinkageが失敗した場合も元の例外が送出され、一時ファイルが削除されることを確認"""
+        from unittest.mock import patch
+        import clustering as clustering_module
+
+        clustering = DataClustering({'company_cluster_settings': {}, 'scratch_dir': str(tmp_path)})
+        tfidf_matrix = _tfidf_vectorize(['在庫 管理', '在庫 管理 システム', '人事 給与'])
+
+        with patch.object(clustering_module, 'average_linkage', side_effect=RuntimeError('linkage failed')):
+            with pytest.raises(RuntimeError, match='linkage failed'):
+                clustering._dense_linkage(tfidf_matrix, on_disk=True)
+        assert list(tmp_path.iterdir()) == []
+
+    # ========================================
+    # 追加テスト: 全社共通TF-IDF
+    # ========================================
+    def test_global_tfidf_fitted_once(self, sample_dataframe):
+        """tfidf_scope: global ではベクトル化が全社で1回だけ行われることを確認"""
+        from unittest.mock import patch
+        import clustering as clustering_module
+
+        global_scope = DataClustering({'company_cluster_settings': {}, 'tfidf_scope': 'global'})
+        company_scope = DataClustering({'company_cluster_settings': {}, 'tfidf_scope': 'company'})
+
+        with patch.object(clustering_module, '_tfidf_vectorize', wraps=clustering_module._tfidf_vectorize) as spy:
+            global_scope.cluster_by_company(sample_dataframe, '正規化テキスト')
+            assert spy.call_count == 1
+
+        with patch.object(clustering_module, '_tfidf_vectorize', wraps=clustering_module._tfidf_vectorize) as spy:
+            company_scope.cluster_by_company(sample_dataframe, '正規化テキスト')
+            assert spy.call_count == sample_dataframe['会社名'].nunique()
+
+    def test_tfidf_scope_defaults_to_company(self, caplog):
+        """tfidf_scope の既定値・不正値は company（会社ごとに学習）になることを確認"""
+        assert DataClustering({'company_cluster_settings': {}}).tfidf_scope == 'company'
+        assert DataClustering({'company_cluster_settings': {}, 'tfidf_scope': 'invalid'}).tfidf_scope == 'company'
+        assert "不正なTF-IDF設定" in caplog.text
+
+    def test_global_tfidf_matches_company_for_single_company(self):
+        """会社が1社のみの場合、globalとcompanyの結果が一致することを確認"""
+        texts = ['在庫 管理 システム', '在庫 管理', '顧客 管理 システム', '顧客 管理 基盤', '人事 給与', '人事 給与 システム']
+        df = pd.DataFrame({
+            'オーダーID': [f'ORD-{i:03d}' for i in range(len(texts))],
+            '会社名': ['テスト会社'] * len(texts),
+            '作業名称': texts,
+            '正規化テキスト': texts
+        })
+
+        global_df = DataClustering({'company_cluster_settings': {}, 'tfidf_scope': 'global'}).cluster_by_company(
+            df, '正規化テキスト')
+        company_df = DataClustering({'company_cluster_settings': {}, 'tfidf_scope': 'company'}).cluster_by_company(
+            df, '正規化テキスト')
+
+        pd.testing.assert_frame_equal(global_df, company_df)
+
+    # ========================================
+    # 追加テスト: 文字n-gramハッシュによるベクトル化
+    # ========================================
+    def test_char_hashing_vectorizer(self):
+        """文字n-gramハッシュで固定次元・表記の近い名称が類似になることを確認"""
+        texts = ['在庫管理システム開発', '在庫管理システム改修', '人事給与計算']
+
+        word_matrix = _tfidf_vectorize(texts)
+        char_matrix = _tfidf_vectorize(texts, vectorizer='char_hashing', n_features=2 ** 12, chunk_size=2)
+
+        assert char_matrix.shape == (3, 2 ** 12)
+        # 単語単位では文字列全体が1トークンのため類似度0
+        assert (word_matrix[0] @ word_matrix[1].T).toarray()[0, 0] == 0
+        assert (char_matrix[0] @ char_matrix[1].T).toarray()[0, 0] > 0.5
+        assert (char_matrix[0] @ char_matrix[2].T).toarray()[0, 0] < 0.1
+
+    def test_char_hashing_single_character_texts(self):
+        """1文字の名称も零ベクトルにならず、その文字を含む名称と同じクラスタになることを確認"""
+        texts = ['人', '在', '在庫管理', '人事給与']
+        matrix = _tfidf_vectorize(texts, vectorizer='char_hashing', n_features=2 ** 12)
+        assert np.allclose(np.asarray(matrix.multiply(matrix).sum(axis=1)).ravel(), 1.0)
+
+        df = pd.DataFrame({
+            'オーダーID': [f'ORD-{i:03d}' for i in range(len(texts))],
+            '会社名': ['テスト会社'] * len(texts),
+            '作業名称': texts,
+            '正規化テキスト': texts
+        })
+        clustering = DataClustering({'company_cluster_settings': {'テスト会社': 2}, 'vectorizer': 'char_hashing'})
+        result_df = clustering.cluster_by_company(df, '正規化テキスト')
+
+        ids = result_df['クラスタID'].tolist()
+        assert ids[0] == ids[3] and ids[1] == ids[2] and ids[0] != ids[1]
+
+    def test_char_hashing_clustering(self, sample_dataframe):
+        """vectorizer: char_hashing でクラスタリングできることを確認"""
+        clustering = DataClustering({'company_cluster_settings': {}, 'vectorizer': 'char_hashing'})
+        result_df = clustering.cluster_by_company(sample_dataframe, '正規化テキスト')
+
+        assert len(result_df) == len(sample_dataframe)
+        assert result_df['クラスタID'].min() >= 1
+        assert result_df['代表名'].notna().all()
+
+    # ========================================
+    # 追加テスト: MinHash LSHブロッキング
+    # ========================================
+    def test_lsh_blocking_matches_unblocked(self):
+        """無関係なグループに分かれるデータでは、ブロッキングの有無で分割が一致することを確認"""
+        texts = [
+            '在庫管理システム', '在庫管理システム改修', '在庫管理システム保守',
+            '人事給与計算', '人事給与計算対応',
+            '会計基盤刷新', '会計基盤刷新支援'
+        ]
+        df = pd.DataFrame({
+            'オーダーID': [f'ORD-{i:03d}' for i in range(len(texts))],
+            '会社名': ['テスト会社'] * len(texts),
+            '作業名称': texts,
+            '正規化テキスト': texts
+        })
+        config = {'company_cluster_settings': {'テスト会社': 3}, 'vectorizer': 'char_hashing'}
+
+        plain_ids = DataClustering({**config, 'lsh_min_rows': 0}).cluster_by_company(
+            df, '正規化テキスト')['クラスタID'].to_numpy()
+        blocked_ids = DataClustering({**config, 'lsh_min_rows': 1}).cluster_by_company(
+            df, '正規化テキスト')['クラスタID'].to_numpy()
+
+        assert len(set(blocked_ids)) == 3
+        assert np.array_equal(plain_ids[:, None] == plain_ids, blocked_ids[:, None] == blocked_ids)
+
+    # ========================================
+    # 追加テスト: 既存クラスタへの割り当て（--assign）
+    # ========================================
+    @pytest.fixture
+    def assign_dataframes(self):
+        """クラスタリング用と割り当て用のデータ"""
+        def make(rows):
+            return pd.DataFrame({
+                'オーダーID': [f'ORD-{i:03d}' for i in range(len(rows))],
+                '会社名': [company for company, _ in rows],
+                '作業名称': [text for _, text in rows],
+                '正規化テキスト': [text for _, text in rows]
+            })
+
+        base = make([
+            ('A社', '在庫 管理 システム'), ('A社', '在庫 管理 改修'), ('A社', '在庫 管理 保守'),
+            ('A社', '人事 給与 計算'), ('A社', '人事 給与 対応'),
+            ('B社', '会計 基盤 刷新'), ('B社', '会計 基盤 支援')
+        ])
+        new = make([
+            ('A社', '人事 給与 改修'), ('A社', '在庫 管理 対応'),
+            ('B社', '会計 基盤 刷新'), ('C社', '営業 支援')
+        ])
+        return base, new
+
+    def test_assign_to_existing_clusters(self, assign_dataframes, tmp_path):
+        """新しいオーダーが保存時のクラスタID・代表名に割り当てられることを確認"""
+        base, new = assign_dataframes
+        config = {'company_cluster_settings': {'A社': 2}, 'model_path': str(tmp_path / 'model')}
+
+        clustered = DataClustering(config).cluster_by_company(base, '正規化テキスト')
+        assigned = DataClustering(config).assign_by_company(new, '正規化テキスト')
+
+        def cluster_of(df, company, text):
+            row = df[(df['会社名'] == company) & (df['作業名称'] == text)].iloc[0]
+            return row['クラスタID'], row['代表名']
+
+        assert cluster_of(assigned, 'A社', '人事 給与 改修') == cluster_of(clustered, 'A社', '人事 給与 計算')
+        assert cluster_of(assigned, 'A社', '在庫 管理 対応') == cluster_of(clustered, 'A社', '在庫 管理 システム')
+        assert cluster_of(assigned, 'B社', '会計 基盤 刷新') == cluster_of(clustered, 'B社', '会計 基盤 刷新')
+        # モデルにない会社は新規にクラスタリングされる
+        assert cluster_of(assigned, 'C社', '営業 支援') == (1, '営業 支援')
+
+    def test_assign_adds_clusters_on_drift(self, assign_dataframes, tmp_path):
+        """未一致率が閾値を超えた場合、未一致の行が新しいクラスタIDで追加されることを確認"""
+        base, _ = assign_dataframes
+        config = {'company_cluster_settings': {'A社': 2}, 'model_path': str(tmp_path / 'model')}
+        DataClustering(config).cluster_by_company(base, '正規化テキスト')
+
+        drifted = base[base['会社名'] == 'A社'].head(2).copy()
+        drifted['作業名称'] = ['物流 倉庫 移行', '在庫 管理 システム']
+        drifted['正規化テキスト'] = drifted['作業名称']
+        assigned = DataClustering({**config, 'drift_threshold': 0.1}).assign_by_company(drifted, '正規化テキスト')
+
+        ids = dict(zip(assigned['作業名称'], assigned['クラスタID']))
+        assert ids['物流 倉庫 移行'] == 3
+        assert ids['在庫 管理 システム'] in (1, 2)
+
+    def test_assign_unseen_vocabulary_is_stable(self, assign_dataframes, tmp_path):
+        """未知の語だけの行は新しく学習した語彙で別々のクラスタになり、再割り当てしてもIDが増えないことを確認"""
+        from cluster_model import ClusterModel
+
+        base, _ = assign_dataframes
+        config = {'company_cluster_settings': {}, 'model_path': str(tmp_path / 'model'), 'drift_threshold': 0.1}
+        clustered = DataClustering(config).cluster_by_company(base, '正規化テキスト')
+        n_existing = clustered.loc[clustered['会社名'] == 'A社', 'クラスタID'].max()
+
+        texts = ['物流 倉庫 移行', '物流 倉庫 保守', '営業 企画 支援', '営業 企画 対応', '在庫 管理 対応']
+        drifted = pd.DataFrame({
+            'オーダーID': [f'NEW-{i:03d}' for i in range(len(texts))],
+            '会社名': ['A社'] * len(texts),
+            '作業名称': texts,
+            '正規化テキスト': texts
+        })
+        first = DataClustering(config).assign_by_company(drifted, '正規化テキスト')['クラスタID'].tolist()
+        second = DataClustering(config).assign_by_company(drifted, '正規化テキスト')['クラスタID'].tolist()
+
+        assert first[0] == first[1] > n_existing
+        assert first[2] == first[3] > n_existing
+        assert first[0] != first[2]
+        assert first[4] <= n_existing
+        assert second == first
+        model = ClusterModel.load(tmp_path / 'model')
+        assert len(model.companies['A社']['extensions']) == 1
+        assert len(model.companies['A社']['representatives']) == max(first)
+
+    def test_single_row_company_saved_in_model(self, assign_dataframes, tmp_path):
+        """1件だけの会社もモデルに保存され、割り当て時に新規にクラスタリングし直さないことを確認"""
+        from unittest.mock import patch
+
+        base, _ = assign_dataframes
+        single = base.head(1).assign(会社名='D社', 作業名称='営業 支援', 正規化テキスト='営業 支援')
+        config = {'company_cluster_settings': {}, 'model_path': str(tmp_path / 'model')}
+        DataClustering(config).cluster_by_company(pd.concat([base, single]), '正規化テキスト')
+
+        new = single.assign(作業名称='営業 支援 対応', 正規化テキスト='営業 支援 対応')
+        clustering = DataClustering(config)
+        with patch.object(DataClustering, '_cluster_company') as cluster_company:
+            assigned = clustering.assign_by_company(new, '正規化テキスト')
+
+        cluster_company.assert_not_called()
+        assert assigned[['クラスタID', '代表名']].values.tolist() == [[1, '営業 支援']]
+
+    def test_assign_requires_model_path(self, assign_dataframes):
+        """model_path 未設定で割り当てるとエラーになることを確認"""
+        _, new = assign_dataframes
+        with pytest.raises(ValueError):
+            DataClustering({}).assign_by_company(new, '正規化テキスト')
+
+    # ========================================
+    # 追加テスト: 結果キャッシュ
+    # ========================================
+    def test_result_cache_skips_unchanged_companies(self, sample_dataframe, tmp_path):
+        """テキストが変わらない会社はキャッシュから同じ結果を再利用することを確認"""
+        from unittest.mock import patch
+
+        config = {'company_cluster_settings': {}, 'tfidf_scope': 'company', 'cache_dir': str(tmp_path)}
+        first = DataClustering(config).cluster_by_company(sample_dataframe, '正規化テキスト')
+
+        changed = sample_dataframe.copy()
+        changed.loc[changed['会社名'] == '東京システム株式会社', '正規化テキスト'] = '会計 基盤 刷新'
+        clustering = DataClustering(config)
+        with patch.object(DataClustering, '_cluster_company', autospec=True,
+                          side_effect=DataClustering._cluster_company) as spy:
+            second = clustering.cluster_by_company(changed, '正規化テキスト')
+
+        assert [call.args[1] for call in spy.call_args_list] == ['東京システム株式会社']
+        assert (clustering.cache.hits, clustering.cache.misses) == (1, 1)
+        unchanged = second['会社名'] == 'みらい銀行'
+        assert second[unchanged]['クラスタID'].tolist() == first[unchanged]['クラスタID'].tolist()
+        assert second[unchanged]['代表名'].tolist() == first[unchanged]['代表名'].tolist()
+
+    def test_result_cache_misses_on_setting_change(self, sample_dataframe, tmp_path):
+        """会社のクラスタ数設定が変わった場合はキャッシュを使わないことを確認"""
+        config = {'company_cluster_settings': {}, 'tfidf_scope': 'company', 'cache_dir': str(tmp_path)}
+        DataClustering(config).cluster_by_company(sample_dataframe, '正規化テキスト')
+
+        clustering = DataClustering({**config, 'company_cluster_settings': {'みらい銀行': 1}})
+        result_df = clustering.cluster_by_company(sample_dataframe, '正規化テキスト')
+
+        assert clustering.cache.misses == 1
+        assert result_df[result_df['会社名'] == 'みらい銀行']['クラスタID'].nunique() == 1
+
+    def test_result_cache_ignores_tuning_settings(self, sample_dataframe, tmp_path):
+        """並列実行・チャンク分割の設定だけを変えた場合はキャッシュを使うことを確認"""
+        config = {'company_cluster_settings': {}, 'tfidf_scope': 'company', 'cache_dir': str(tmp_path)}
+        first_df = DataClustering(config).cluster_by_company(sample_dataframe, '正規化テキスト')
+
+        clustering = DataClustering({
+            **config, 'batch_rows': 10, 'giant_rows': 5, 'parallel_memory_mb': 1,
+            'distance_chunk_size': 7, 'knn_chunk_size': 3, 'vectorize_chunk_size': 2
+        })
+        result_df = clustering.cluster_by_company(sample_dataframe, '正規化テキスト')
+
+        assert clustering.cache.misses == 0
+        assert clustering.cache.hits == sample_dataframe['会社名'].nunique()
+        assert result_df['クラスタID'].tolist() == first_df['クラスタID'].tolist()
+
+    # ========================================
+    # 追加テスト: 自明な会社の高速処理
+    # ========================================
+    @pytest.mark.parametrize('texts, setting, expected_ids', [
+        (['在庫管理', '在庫管理', '在庫管理'], None, [1, 1, 1]),      # 全て同じテキスト
+        (['在庫管理', '人事給与'], None, [1, 1]),                      # 2件以下は自動計算=1
+        (['在庫管理', '人事給与'], '+1', [1, 2]),
+        (['在庫管理', '人事給与', '在庫管理', '会計'], 3, [1, 2, 1, 3]),  # ユニーク数 ≦ 固定クラスタ数
+        (['在庫管理', '人事給与', '会計'], 1, [1, 1, 1])
+    ])
+    def test_trivial_companies_skip_vectorization(self, texts, setting, expected_ids):
+        """ユニークなテキストだけで結果が決まる会社はベクトル化せずにクラスタIDを付与することを確認"""
+        from unittest.mock import patch
+        import clustering as clustering_module
+
+        df = pd.DataFrame({
+            'オーダーID': [f'ORD-{i:03d}' for i in range(len(texts))],
+            '会社名': ['テスト会社'] * len(texts),
+            '作業名称': texts,
+            '正規化テキスト': texts
+        })
+        settings = {'テスト会社': setting} if setting is not None else {}
+        clustering = DataClustering({'company_cluster_settings': settings, 'tfidf_scope': 'company'})
+
+        with patch.object(clustering_module, '_tfidf_vectorize') as spy:
+            result_df = clustering.cluster_by_company(df, '正規化テキスト')
+
+        assert spy.call_count == 0
+        assert result_df['クラスタID'].tolist() == expected_ids
+        if len(set(expected_ids)) == len(set(texts)):
+            assert result_df['代表名'].tolist() == texts
+
+    # ========================================
+    # 追加テスト: クラスタ数の選び方
+    # ========================================
+    @pytest.mark.parametrize('strategy', ['gap', 'threshold', 'silhouette'])
+    def test_cluster_count_strategies(self, sample_dataframe, strategy):
+        """cluster_count_strategy の各方式でクラスタリングできることを確認"""
+        clustering = DataClustering({'company_cluster_settings': {}, 'cluster_count_strategy': strategy})
+        result_df = clustering.cluster_by_company(sample_dataframe, '正規化テキスト')
+
+        for _, group in result_df.groupby('会社名'):
+            assert 2 <= group['クラスタID'].nunique() <= max(2, len(group) // 2)
+
+    def test_threshold_strategy_uses_distance_threshold(self, clustering):
+        """threshold 方式では distance_threshold 以下の併合のみ適用したクラスタ数になることを確認"""
+        clustering.cluster_count_strategy = 'threshold'
+        linkages = np.array([
+            [0, 1, 0.1, 2],
+            [2, 3, 0.2, 2],
+            [4, 5, 0.3, 3],
+            [6, 7, 0.5, 4],
+            [8, 9, 0.8, 5]
+        ])
+
+        assert clustering.calculate_default_clusters(0.25, linkages, 10) == 4
+        assert clustering.calculate_default_clusters(0.9, linkages, 10) == 2
+
+    # ========================================
+    # 追加テスト: 距離閾値モード
+    # ========================================
+    def test_threshold_mode_cuts_at_distance(self):
+        """mode: threshold では距離閾値で切断し、2〜n/2 の制約を受けないことを確認"""
+        df = pd.DataFrame({
+            '会社名': ['テスト会社'] * 4,
+            '作業名称': ['A', 'A', 'B', 'C'],
+            '正規化テキスト': ['a b', 'a b', 'c d', 'e f']
+        })
+        # 完全に異なるテキスト（距離1.0）は閾値0.5では併合されない
+        clustering = DataClustering({'company_cluster_settings': {}, 'mode': 'threshold',
+                                     'cluster_distance_threshold': 0.5})
+        result_df = clustering.cluster_by_company(df, '正規化テキスト')
+        assert result_df['クラスタID'].nunique() == 3
+
+        clustering.cluster_distance_threshold = 1.0
+        result_df = clustering.cluster_by_company(df, '正規化テキスト')
+        assert result_df['クラスタID'].nunique() == 1
+
+    def test_threshold_mode_company_overrides(self):
+        """mode: threshold でも会社別設定（固定数・オフセット・距離閾値）が優先されることを確認"""
+        clustering = DataClustering({
+            'mode': 'threshold',
+            'cluster_distance_threshold': 0.25,
+            'company_cluster_settings': {'固定': 3, 'オフセット': '+1', '閾値': {'threshold': 0.9}}
+        })
+        linkages = np.array([
+            [0, 1, 0.1, 2],
+            [2, 3, 0.2, 2],
+            [4, 5, 0.3, 3],
+            [6, 7, 0.5, 4],
+            [8, 9, 0.8, 5]
+        ], dtype=float)
+
+        assert clustering._select_cluster_count('その他', linkages) == 4
+        assert clustering._select_cluster_count('固定', linkages) == 3
+        assert clustering._select_cluster_count('オフセット', linkages) == 5
+        assert clustering._select_cluster_count('閾値', linkages) == 1
+
+    def test_invalid_mode_falls_back_to_count(self, caplog):
+        """不正なモードは count にフォールバックすることを確認"""
+        clustering = DataClustering({'company_cluster_settings': {}, 'mode': 'invalid'})
+        assert clustering.mode == 'count'
+        assert "不正なモード設定" in caplog.text
+
+    # ========================================
+    # 追加テスト: カテゴリ型のテキスト列
+    # ========================================
+    @pytest.mark.parametrize('collapse', [False, True])
+    def test_categorical_text_column_matches_strings(self, sample_dataframe, collapse):
+        """カテゴリ型の正規化テキスト列でも文字列の列と同じ結果になることを確認"""
+        config = {'company_cluster_settings': {}, 'collapse_duplicates': collapse}
+        categorical_df = sample_dataframe.assign(正規化テキスト=sample_dataframe['正規化テキスト'].astype('category'))
+
+        expected = DataClustering(config).cluster_by_company(sample_dataframe, '正規化テキスト')
+        result = DataClustering(config).cluster_by_company(categorical_df, '正規化テキスト')
+
+        assert result['クラスタID'].tolist() == expected['クラスタID'].tolist()
+        assert result['代表名'].tolist() == expected['代表名'].tolist()
+
+    def test_text_codes_uses_categorical_codes(self):
+        """カテゴリ型はコードをそのまま使い、欠損値は空文字列として扱うことを確認"""
+        from clustering import _text_codes
+
+        column = pd.Series(pd.Categorical(['b', None, 'a', 'b'], categories=['b', 'a']))
+        codes, categories = _text_codes(column)
+
+        assert categories.tolist() == ['b', 'a', '']
+        assert codes.tolist() == [0, 2, 1, 0]
@@ -0,0 +1,61 @@
+"""
+MinHash Blocking Module Tests
+
+テスト対象:
+- MinHash署名の計算
+- LSHによる候補ブロック分割
+"""
+
+import pytest
+import numpy as np
+import sys
+from pathlib import Path
+
+# Add src to path for imports
+sys.path.insert(0, str(Path(__file__).parent.parent / 'src'))
+
+from minhash_blocking import MinHashBlocker
+
+
+class TestMinHashBlocker:
+    """MinHashBlocker クラスのテスト"""
+
+    @pytest.fixture
+    def blocker(self):
+        """デフォルト設定のブロッカー"""
+        return MinHashBlocker(num_perm=64, bands=16, shingle_size=2, chunk_size=3)
+
+    def test_signature_shape(self, blocker):
+        """署名がテキスト数 × num_perm になることを確認"""
+        texts = ['在庫管理システム', '人事給与', '', 'あ']
+        signatures = blocker.signatures(texts)
+
+        assert signatures.shape == (4, 64)
+
+    def test_identical_texts_same_signature(self, blocker):
+        """同一テキストの署名が一致することを確認（チャンク境界をまたぐ場合も含む）"""
+        texts = ['在庫管理システム', '人事給与', '会計基盤', '在庫管理システム']
+        signatures = blocker.signatures(texts)
+
+        assert np.array_equal(signatures[0], signatures[3])
+        assert not np.array_equal(signatures[0], signatures[1])
+
+    def test_block_separates_unrelated_texts(self, blocker):
+        """表記の近いテキストは同じブロック、無関係なテキストは別ブロックになることを確認"""
+        texts = [
+            '在庫管理システム',
+            '在庫管理システム改修',
+            '在庫管理システム',
+            '人事給与計算',
+            '人事給与計算対応'
+        ]
+        blocks = blocker.block(texts)
+
+        assert blocks[0] == blocks[1] == blocks[2]
+        assert blocks[3] == blocks[4]
+        assert blocks[0] != blocks[3]
+
+    def test_invalid_bands(self):
+        """bands が num_perm の約数でない場合にエラーとなることを確認"""
+        with pytest.raises(ValueError):
+            MinHashBlocker(num_perm=64, bands=10)
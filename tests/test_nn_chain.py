@@ -0,0 +1,88 @@
+"""
+NN-Chain Linkage Module Tests
+
+テスト対象:
+- 最近傍チェーン法の average linkage が scipy と同じ併合順になること
+- 重み付き（重複をまとめた要素）の併合距離
+- numba用のスカラー版がNumPy版と一致すること
+"""
+
+import pytest
+import numpy as np
+import pandas as pd
+import sys
+from pathlib import Path
+from scipy.cluster.hierarchy import linkage
+from scipy.spatial.distance import pdist
+
+# Add src to path for imports
+sys.path.insert(0, str(Path(__file__).parent.parent / 'src'))
+
+from nn_chain import average_linkage, _nn_chain_loop, _nn_chain_numpy
+from clustering import _condensed_cosine_distances, _tfidf_vectorize
+
+
+class TestAverageLinkage:
+    """average_linkage 関数のテスト"""
+
+    def test_matches_scipy_on_test_data(self):
+        """テストデータの各社で scipy と同じ併合順・併合距離になることを確認"""
+        data_path = Path(__file__).parent / 'data' / 'test_sample.csv'
+        df = pd.read_csv(data_path, encoding='utf-8')
+
+        for _, group in df.groupby('会社名'):
+            condensed = _condensed_cosine_distances(_tfidf_vectorize(group['作業名称'].tolist()), 1000)
+            expected = linkage(condensed, method='average')
+            assert np.array_equal(average_linkage(condensed.copy()), expected)
+
+    def test_matches_scipy_with_ties(self):
+        """同距離が多いデータでも scipy と同じ linkage 行列になることを確認"""
+        rng = np.random.default_rng(0)
+        for _ in range(20):
+            condensed = np.round(pdist(rng.random((30, 4))), 1)
+            assert np.array_equal(average_linkage(condensed.copy()), linkage(condensed, method='average'))
+
+    def test_weighted_matches_expanded_rows(self):
+        """重み付きの併合距離が、重複を展開した全行の併合距離（距離0を除く）と一致することを確認"""
+        rng = np.random.default_rng(1)
+        points = rng.random((8, 3))
+        weights = np.array([1, 3, 1, 2, 1, 1, 4, 1])
+
+        weighted = average_linkage(pdist(points), weights)
+        expanded = linkage(pdist(np.repeat(points, weights, axis=0)), method='average')
+
+        assert np.allclose(weighted[:, 2], expanded[expanded[:, 2] > 0, 2])
+        assert weighted[-1, 3] == weights.sum()
+
+    def test_single_element(self):
+        """要素が1件の場合は空の linkage 行列を返すことを確認"""
+        assert average_linkage(np.zeros(0, dtype=np.float32)).shape == (0, 4)
+
+    def test_scalar_loop_matches_numpy(self):
+        """numba用のスカラー版がNumPy版と同じ併合をすることを確認（numbaなしで実行）"""
+        rng = np.random.default_rng(2)
+        condensed = np.round(pdist(rng.random((25, 3))), 1).astype(np.float32)
+        weights = rng.integers(1, 4, 25).astype(float)
+
+        expected = _nn_chain_numpy(condensed.copy(), weights.copy())
+        actual = _nn_chain_loop(condensed.copy(), weights.copy())
+
+        assert np.allclose(np.array(expected), actual)
+
+    def test_numba_matches_numpy(self):
+        """numba がある場合、numba版がNumPy版と同じ結果になることを確認"""
+        pytest.importorskip('numba')
+        condensed = pdist(np.random.default_rng(3).random((40, 3))).astype(np.float32)
+
+        assert np.array_equal(
+            average_linkage(condensed.copy(), use_numba=True),
+            average_linkage(condensed.copy(), use_numba=False)
+        )
+
+    def test_jit_is_deferred_until_first_use(self):
+        """import時にはnumbaのコンパイルを行わないことを確認"""
+        import importlib
+        import nn_chain
+
+        reloaded = importlib.reload(nn_chain)
+        assert reloaded._nn_chain_jit is None
@@ -0,0 +1,84 @@
+"""
+Phrase Matcher Module Tests
+
+テスト対象:
+- Aho-Corasick による複数フレーズの除去・置換
+- 最長一致・単語境界・大文字小文字の扱い
+- pickleキャッシュ
+"""
+
+import re
+import sys
+from pathlib import Path
+
+# Add src to path for imports
+sys.path.insert(0, str(Path(__file__).parent.parent / 'src'))
+
+from phrase_matcher import PhraseMatcher
+
+
+class TestPhraseMatcher:
+    """PhraseMatcher クラスのテスト"""
+
+    def test_leftmost_longest_removal(self):
+        """各位置で最長のフレーズが重ならないように除去されることを確認"""
+        matcher = PhraseMatcher({'運用': '', '保守': '', '運用保守': '', 'テスト': '', '単体テスト': ''})
+        assert matcher.sub('在庫管理運用保守') == '在庫管理'
+        assert matcher.sub('単体テスト結果') == '結果'
+        assert matcher.sub('運用と保守') == 'と'
+        assert matcher.sub('対象なし') == '対象なし'
+
+    def test_suffix_matches_via_fail_links(self):
+        """失敗遷移をたどって接尾辞のフレーズも見つかることを確認"""
+        matcher = PhraseMatcher({'abcd': 'X', 'bc': 'Y', 'c': 'Z'})
+        assert matcher.sub('abce') == 'aYe'
+        assert matcher.sub('abcd') == 'X'
+        assert matcher.sub('xcx') == 'xZx'
+
+    def test_ignore_case(self):
+        """ignore_case で大文字小文字を区別せずに照合し、元の文字を残すことを確認"""
+        matcher = PhraseMatcher({'Test': '', 'PMO': ''}, ignore_case=True)
+        assert matcher.sub('SystemTEST-pmo-Keep') == 'System--Keep'
+
+    def test_word_boundary_matches_regex(self):
+        """word_boundary が正規表現の \\b と同じ結果になることを確認"""
+        phrases = {'S': 'システム', 'SYS': 'システム', 'DB': 'データベース', 'Web': 'ウェブ'}
+        matcher = PhraseMatcher(phrases, word_boundary=True)
+
+        def sequential(text):
+            for abbr, full in phrases.items():
+                text = re.sub(r'\b' + re.escape(abbr) + r'\b', full, text)
+            return text
+
+        for text in ['在庫 S', 'SYS/DB', 'DBS', 'Web_DB', 'S-Web-S', '顧客管理S', 'DB2', '']:
+            assert matcher.sub(text) == sequential(text)
+
+    def test_extra_candidates(self):
+        """辞書以外の一致候補も最長一致で採用されることを確認"""
+        matcher = PhraseMatcher({'P': ''})
+        text = 'P12P'
+        extra = [(m.start(), m.end(), '') for m in re.finditer(r'P\d+', text)]
+        assert matcher.sub(text, extra) == ''
+
+    def test_cached_round_trip(self, tmp_path):
+        """キャッシュしたオートマトンが同じ結果を返し、辞書が変わると再構築されることを確認"""
+        phrases = {'運用保守': '', '開発': ''}
+        first = PhraseMatcher.cached(phrases, tmp_path, ignore_case=True)
+        assert len(list(tmp_path.glob('phrases-*.pkl'))) == 1
+
+        second = PhraseMatcher.cached(phrases, tmp_path, ignore_case=True)
+        assert second is not first
+        assert second.sub('在庫開発運用保守') == first.sub('在庫開発運用保守') == '在庫'
+
+        PhraseMatcher.cached({**phrases, '移行': ''}, tmp_path, ignore_case=True)
+        assert len(list(tmp_path.glob('phrases-*.pkl'))) == 2
+
+    def test_corrupt_cache_is_rebuilt(self, tmp_path):
+        """壊れたキャッシュは再構築されることを確認"""
+        phrases = {'開発': ''}
+        PhraseMatcher.cached(phrases, tmp_path)
+        path = next(tmp_path.glob('phrases-*.pkl'))
+        path.write_bytes(b'broken')
+
+        matcher = PhraseMatcher.cached(phrases, tmp_path)
+        assert matcher.sub('在庫開発') == '在庫'
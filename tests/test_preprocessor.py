@@ -8,6 +8,9 @@ Preprocessor Module Tests
 - 各前処理パターンの検証
 """
 
+import csv
+import re
+
 import pytest
 import sys
 from pathlib import Path
@@ -327,3 +330,138 @@ class TestTextPreprocessor:
         text2 = "FY2024在庫管理システム"
         result2 = preprocessor2.preprocess(text2)
         assert 'FY2024' in result2  # 時期情報が保持されている
+
+    # ========================================
+    # 追加テスト: 選択パターンによる一括除去
+    # ========================================
+    @staticmethod
+    def _sequential_sub(text, patterns):
+        """従来方式（パターンを1つずつ順番に適用）"""
+        for pattern in patterns:
+            text = re.sub(pattern, '', text, flags=re.IGNORECASE)
+        return text
+
+    def test_alternation_matches_sequential_removal(self, preprocessor):
+        """時期・フェーズの一括除去が従来の逐次適用と同じ結果になることを確認"""
+        sample_csv = Path(__file__).parent / 'data' / 'test_sample.csv'
+        with open(sample_csv, encoding='utf-8') as f:
+            texts = [row['作業名称'] for row in csv.DictReader(f)]
+        texts += [
+            '在庫管理システム運用保守',
+            '運用保守_顧客管理',
+            '基盤更改/単体テスト/結合テスト',
+            'EDI連携システムテスト',
+            'Webサイト RequirementDefinition FY24',
+            'ポータル（Phase2）2024年度 第3四半期',
+            '人事給与 UT/IT/ST 令和元年度',
+            '会計 O&M 10月度',
+            'データ分析基盤 フェーズ3 1Q',
+            'ＦＹ２０２４営業支援 Maintenance',
+            # 略称（IT・BD など）より完全な語（Test・Design）を先に除去する
+            'APITest',
+            'UITest',
+            'SysTest',
+            'WebDesign',
+            'DBDesign',
+            'PDD1',
+            'フェーズ32024年度',
+        ]
+
+        for text in texts:
+            period = self._sequential_sub(text, preprocessor.period_patterns)
+            assert preprocessor._remove_period(text) == period
+            phase = self._sequential_sub(period, preprocessor.phase_patterns)
+            assert preprocessor._remove_phase(period) == phase
+
+    def test_alternation_prefers_longer_phase(self, preprocessor):
+        """「運用保守」が「運用」より優先して1語として除去されることを確認"""
+        assert preprocessor._remove_phase('在庫管理運用保守') == '在庫管理'
+        assert preprocessor._remove_phase('要件定義書') == '書'
+        assert preprocessor.preprocess('APITest') == 'ＡＰＩ'
+        assert preprocessor.preprocess('WebDesign') == 'Ｗｅｂ'
+
+    # ========================================
+    # 追加テスト: 辞書照合（フェーズ名・略語）
+    # ========================================
+    def test_abbreviations_match_sequential_regex(self):
+        """略語正規化が従来の単語境界付き re.sub の逐次適用と同じ結果になることを確認"""
+        preprocessor = TextPreprocessor({'normalize_abbreviations': True})
+        texts = ['在庫管理 S', 'SYS更改', 'CRM/ERP連携', 'Web DB', 'WEB-App', 'AI_ML基盤', 'IoT API', '顧客管理S', 'ＣＲＭ刷新']
+
+        for text in texts:
+            expected = text
+            for abbr, full in preprocessor.abbreviation_map.items():
+                expected = re.sub(r'\b' + re.escape(abbr) + r'\b', full, expected)
+            assert preprocessor._normalize_abbreviations(text) == expected
+
+    def test_extra_dictionary_terms(self, default_config, tmp_path):
+        """追加のフェーズ名・略語が反映され、辞書がキャッシュされることを確認"""
+        config = dict(default_config,
+                      normalize_abbreviations=True,
+                      extra_phase_terms=['稼働後支援'],
+                      extra_abbreviations={'GW': 'ゲートウェイ'},
+                      phrase_cache_dir=str(tmp_path))
+        preprocessor = TextPreprocessor(config)
+
+        assert preprocessor._remove_phase('在庫管理稼働後支援') == '在庫管理'
+        assert preprocessor._normalize_abbreviations('GW 更改') == 'ゲートウェイ 更改'
+        # 辞書照合でも完全な語（追加のフェーズ名を含む）を略称より先に除去する
+        for text, expected in [('APITest稼働後支援', 'API'), ('UITest', 'UI'), ('SysTest', 'Sys'),
+                               ('WebDesign', 'Web'), ('DBDesign', 'DB'), ('PDD1', '')]:
+            assert preprocessor._remove_phase(text) == expected
+        # フェーズ名（語・略称の2段階）と略語の3つ
+        assert len(list(tmp_path.glob('phrases-*.pkl'))) == 3
+
+    # ========================================
+    # 追加テスト: 変換表による文字単位の処理
+    # ========================================
+    def test_translate_tables_match_previous_implementation(self, preprocessor):
+        """変換表による記号除去・全角変換が従来の正規表現・文字ループと一致することを確認"""
+        text = ''.join(chr(code) for code in range(0x10000) if not 0xD800 <= code < 0xE000)
+        symbols_removed = re.sub(preprocessor.symbol_pattern, '', text)
+        widened = ''.join(chr(ord(c) + 0xFEE0) if 0x21 <= ord(c) <= 0x7E else c for c in symbols_removed)
+
+        assert preprocessor._remove_symbols(text) == symbols_removed
+        assert preprocessor._normalize_width(symbols_removed) == widened
+        assert text.translate(preprocessor.symbol_width_table) == widened
+
+    # ========================================
+    # 追加テスト: 前処理結果のLRUキャッシュ
+    # ========================================
+    def test_memo_reports_hits_and_evictions(self, default_config, caplog):
+        """同じテキストはキャッシュから返され、上限を超えると古いものから追い出されることを確認"""
+        preprocessor = TextPreprocessor(dict(default_config, memo_size=2))
+        uncached = TextPreprocessor(dict(default_config, memo_size=0))
+
+        first = ['FY2024在庫管理/開発', '顧客管理/保守', '人事/要件定義']
+        assert preprocessor.preprocess_batch(first) == [uncached.preprocess(text) for text in first]
+
+        with caplog.at_level('INFO'):
+            second = ['人事/要件定義', 'FY2024在庫管理/開発']
+            assert preprocessor.preprocess_batch(second) == [uncached.preprocess(text) for text in second]
+
+        assert (preprocessor.memo_hits, preprocessor.memo_misses, preprocessor.memo_evictions) == (1, 4, 2)
+        assert "ユニーク値のヒット率 50.0%（1/2件）" in caplog.text
+        assert "追い出し 1件" in caplog.text
+
+    # ========================================
+    # 追加テスト: ユニーク値のみの一括前処理
+    # ========================================
+    def test_batch_preprocesses_unique_values_once(self, preprocessor):
+        """ユニークな値だけを前処理し、カテゴリ型で全行に展開することを確認"""
+        import pandas as pd
+        from unittest.mock import patch
+
+        series = pd.Series(
+            ['在庫管理/開発', '在庫管理/保守', None, '在庫管理/開発', '顧客管理'],
+            index=[10, 11, 12, 13, 14], name='作業名称'
+        )
+        with patch.object(preprocessor, '_preprocess', wraps=preprocessor._preprocess) as spy:
+            result = preprocessor.preprocess_batch(series)
+
+        assert spy.call_count == 3
+        assert isinstance(result.dtype, pd.CategoricalDtype)
+        assert result.index.tolist() == series.index.tolist()
+        assert result.tolist() == [preprocessor.preprocess(text) for text in series]
+        # 正規化後に同じになる値は1つのカテゴリにまとまる
+        assert len(result.cat.categories) == 3
@@ -0,0 +1,53 @@
+"""
+Result Cache Module Tests
+
+テスト対象:
+- 会社単位の結果キャッシュ（キー作成・保存・取得・サイズによる削除）
+"""
+
+import os
+import numpy as np
+import sys
+from pathlib import Path
+
+# Add src to path for imports
+sys.path.insert(0, str(Path(__file__).parent.parent / 'src'))
+
+from result_cache import ResultCache
+
+
+class TestResultCache:
+    """ResultCache クラスのテスト"""
+
+    def test_make_key(self):
+        """同じ内容は同じキー、内容・区切りが異なれば異なるキーになることを確認"""
+        key = ResultCache.make_key(['在庫', '管理'], {'engine': 'dense', 'knn_neighbors': 10}, None)
+
+        assert key == ResultCache.make_key(['在庫', '管理'], {'knn_neighbors': 10, 'engine': 'dense'}, None)
+        assert key != ResultCache.make_key(['在庫管理'], {'engine': 'dense', 'knn_neighbors': 10}, None)
+        assert key != ResultCache.make_key(['在庫', '管理'], {'engine': 'sparse_knn', 'knn_neighbors': 10}, None)
+        assert key != ResultCache.make_key(['在庫', '管理'], {'engine': 'dense', 'knn_neighbors': 10}, 3)
+
+    def test_put_and_get(self, tmp_path):
+        """保存した結果を取得でき、ヒット・ミスが数えられることを確認"""
+        cache = ResultCache(tmp_path)
+        cache.put('a', np.array([1, 2, 1]), np.array(['在庫', '人事'], dtype=object))
+
+        cluster_ids, names = cache.get('a')
+        assert list(cluster_ids) == [1, 2, 1]
+        assert list(names) == ['在庫', '人事']
+        assert cache.get('b') is None
+        assert (cache.hits, cache.misses) == (1, 1)
+
+    def test_evict_least_recently_used(self, tmp_path):
+        """上限を超えた場合、最後に使った日時が古い結果から削除されることを確認"""
+        cache = ResultCache(tmp_path, max_size_mb=0)
+        for number, key in enumerate(['old', 'used', 'new']):
+            cache.put(key, np.arange(1000), np.array(['x']))
+            os.utime(tmp_path / f"{key}.npz", (number, number))
+        cache.get('old')
+
+        entry_size = (tmp_path / 'new.npz').stat().st_size
+        cache.max_size_mb = 2 * entry_size / 1024 ** 2
+        assert cache.evict() == 1
+        assert sorted(path.stem for path in tmp_path.glob('*.npz')) == ['new', 'old']
@@ -0,0 +1,120 @@
+"""
+Scheduler Module Tests
+
+テスト対象:
+- 件数による単独実行・バッチの振り分け
+- メモリ上限による同時実行数の制限
+"""
+
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+# Add src to path for imports
+sys.path.insert(0, str(Path(__file__).parent.parent / 'src'))
+
+from scheduler import HybridScheduler
+
+
+class ThreadExecutor(ThreadPoolExecutor):
+    """テスト用: スレッドで実行し、BLASスレッド制限の初期化は行わない"""
+
+    def __init__(self, max_workers, initializer=None):
+        super().__init__(max_workers=max_workers)
+
+
+class TestHybridScheduler:
+    """HybridScheduler クラスのテスト"""
+
+    def test_plan(self):
+        """巨大な会社は単独、その他は件数の多い順に batch_rows 程度でまとめられることを確認"""
+        scheduler = HybridScheduler(workers=2, giant_rows=1000, batch_rows=10)
+        sizes = {0: 3, 1: 5000, 2: 12, 3: 4, 4: 2, 5: 1, 6: 1000}
+
+        giants, batches = scheduler.plan(sizes)
+
+        assert giants == [1, 6]
+        assert batches == [[2], [3, 0, 4, 5]]
+
+    def test_run_collects_all_results(self):
+        """単独実行・バッチ実行の結果が会社番号ごとに集められることを確認"""
+        scheduler = HybridScheduler(workers=2, giant_rows=100, batch_rows=3, executor_class=ThreadExecutor)
+        sizes = {0: 1, 1: 200, 2: 2, 3: 1, 4: 1}
+        single_calls = []
+
+        def run_single(code):
+            single_calls.append(code)
+            return f"single-{code}"
+
+        results = scheduler.run(
+            sizes=sizes,
+            estimate_bytes=lambda n: n,
+            run_single=run_single,
+            batch_function=lambda jobs: [f"batch-{job}" for job in jobs],
+            batch_args=lambda code: code
+        )
+
+        assert single_calls == [1]
+        assert results == {0: 'batch-0', 1: 'single-1', 2: 'batch-2', 3: 'batch-3', 4: 'batch-4'}
+
+    def test_memory_limit_caps_concurrency(self):
+        """見積もりメモリの合計が上限を超えるバッチは同時に実行されないことを確認"""
+        scheduler = HybridScheduler(
+            workers=4, giant_rows=0, batch_rows=1, memory_limit_mb=2.5, executor_class=ThreadExecutor
+        )
+        sizes = {code: 1 for code in range(6)}
+        lock = threading.Lock()
+        state = {'running': 0, 'peak': 0}
+
+        def batch_function(jobs):
+            with lock:
+                state['running'] += 1
+                state['peak'] = max(state['peak'], state['running'])
+            time.sleep(0.02)
+            with lock:
+                state['running'] -= 1
+            return jobs
+
+        results = scheduler.run(
+            sizes=sizes,
+            estimate_bytes=lambda n: 1024 ** 2,
+            run_single=lambda code: code,
+            batch_function=batch_function,
+            batch_args=lambda code: code
+        )
+
+        assert results == {code: code for code in range(6)}
+        assert state['peak'] == 2
+
+    def test_giants_run_alongside_batches(self):
+        """巨大な会社の実行中もバッチが並行して実行されることを確認"""
+        scheduler = HybridScheduler(workers=3, giant_rows=100, batch_rows=1, executor_class=ThreadExecutor)
+        sizes = {0: 200, 1: 1, 2: 1, 3: 1}
+        giant_started = threading.Event()
+        batches_done = threading.Event()
+        finished = []
+
+        def run_single(code):
+            giant_started.set()
+            # バッチが全て終わるまで巨大な会社の処理を終えない（逐次実行ならタイムアウトする）
+            assert batches_done.wait(timeout=5)
+            return code
+
+        def batch_function(jobs):
+            giant_started.wait(timeout=5)
+            finished.extend(jobs)
+            if len(finished) == 3:
+                batches_done.set()
+            return jobs
+
+        results = scheduler.run(
+            sizes=sizes,
+            estimate_bytes=lambda n: n,
+            run_single=run_single,
+            batch_function=batch_function,
+            batch_args=lambda code: code
+        )
+
+        assert results == {code: code for code in range(4)}
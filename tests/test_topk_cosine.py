@@ -0,0 +1,91 @@
+"""
+Top-k Cosine Kernel Tests
+
+テスト対象:
+- 行チャンクごとの上位k件コサイン類似度（密行列による総当たりとの一致）
+- 類似度の下限・候補行列の指定
+- 近傍グラフ・最近傍行
+"""
+
+import numpy as np
+import sys
+from pathlib import Path
+from scipy import sparse
+from sklearn.preprocessing import normalize
+
+# Add src to path for imports
+sys.path.insert(0, str(Path(__file__).parent.parent / 'src'))
+
+from topk_cosine import knn_graph, nearest_rows, top_k_cosine
+
+
+def _random_vectors(n_rows, n_features=30, density=0.2, seed=0):
+    matrix = sparse.random(n_rows, n_features, density=density, random_state=seed, format='csr')
+    return normalize(matrix).tocsr()
+
+
+class TestTopKCosine:
+    """top_k_cosine 関数のテスト"""
+
+    def test_matches_brute_force(self):
+        """チャンクに分けても、密な類似度行列から選んだ上位k件と一致することを確認"""
+        vectors = _random_vectors(57)
+        dense = (vectors @ vectors.T).toarray()
+        np.fill_diagonal(dense, 0)
+
+        result = top_k_cosine(vectors, 4, chunk_size=10)
+
+        assert result.shape == (57, 57)
+        assert np.all(np.diff(result.indptr) <= 4)
+        for row in range(57):
+            positive = np.sort(dense[row][dense[row] > 0])[::-1][:4]
+            assert np.allclose(np.sort(result[row].data)[::-1], positive)
+
+    def test_min_similarity_and_candidates(self):
+        """候補行列を指定した場合は自分自身を除かず、下限以下の類似度は含めないことを確認"""
+        vectors = _random_vectors(20, seed=1)
+        candidates = vectors[:5]
+
+        result = top_k_cosine(vectors, 2, candidates=candidates, min_similarity=0.3)
+
+        assert result.shape == (20, 5)
+        assert np.all(result.data > 0.3)
+        # 候補と同じ行は自分自身（類似度1）が最上位
+        for row in range(5):
+            assert np.isclose(result[row, row], 1.0)
+
+    def test_ties_prefer_lower_column(self):
+        """同じ類似度の場合は列番号の小さい候補が選ばれることを確認"""
+        vectors = sparse.csr_matrix(np.array([[1.0, 0.0], [1.0, 0.0], [1.0, 0.0], [1.0, 0.0]]))
+
+        result = top_k_cosine(vectors, 2)
+
+        assert list(result[3].indices) == [0, 1]
+
+    def test_ties_at_kth_keep_higher_similarities(self):
+        """k番目に同点が並ぶ場合、より高い類似度を全て残し、同点は列番号の小さい方から埋めることを確認"""
+        vectors = normalize(sparse.csr_matrix(np.array([
+            [1.0, 0.0], [1.0, 0.1], [1.0, 1.0], [1.0, 1.0], [1.0, 1.0], [1.0, 0.0]
+        ]))).tocsr()
+
+        result = top_k_cosine(vectors, 3)
+
+        # 行0: 列5（類似度1）・列1 が上位、列2〜4 は同点のため列2を残す
+        assert sorted(result[0].indices) == [1, 2, 5]
+
+    def test_knn_graph_is_symmetric(self):
+        """近傍グラフが対称で、自己ループを含まないことを確認"""
+        graph = knn_graph(_random_vectors(30, seed=2), 3, chunk_size=7)
+
+        assert (graph != graph.T).nnz == 0
+        assert graph.diagonal().sum() == 0
+
+    def test_nearest_rows(self):
+        """最も近い候補と類似度を返し、類似する候補がない行は (0, 0) になることを確認"""
+        vectors = sparse.csr_matrix(np.array([[1.0, 0.0, 0.0], [0.0, 1.0, 0.0], [0.0, 0.0, 1.0]]))
+        candidates = sparse.csr_matrix(np.array([[0.0, 2.0, 0.0], [3.0, 0.0, 0.0]]))
+
+        labels, similarities = nearest_rows(vectors, candidates, chunk_size=2)
+
+        assert list(labels) == [1, 0, 0]
+        assert np.allclose(similarities, [1.0, 1.0, 0.0])